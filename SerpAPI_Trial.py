@@ -1,8 +1,6 @@
 # test_serpapi.py
-import os, requests
-from dotenv import load_dotenv
-load_dotenv()
-k = os.getenv("SERPAPI_KEY")
-r = requests.get("https://serpapi.com/search.json",
-                 params={"engine":"google","q":"OpenAI","api_key":k}, timeout=15)
+from app.config import settings  # loads .env
+from app.services.clients import http_client
+r = http_client().get(settings.serpapi_url,
+                      params={"engine":"google","q":"OpenAI","api_key":settings.serpapi_key}, timeout=15)
 print(r.status_code, r.json().get("error"))
\ No newline at end of file
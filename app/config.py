@@ -9,15 +9,131 @@ class Settings(BaseModel):
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-5-mini")
     openai_fallback_model: str = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-5-nano")
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")  # empty = api.openai.com
+
+    # Prompt size cap; the research pack is trimmed to fit
+    prompt_token_budget: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+    # OpenAI scheduling (0 = no budget); per-model overrides as model:rpm:tpm,...
+    openai_rpm: int = int(os.getenv("OPENAI_RPM", "0"))
+    openai_tpm: int = int(os.getenv("OPENAI_TPM", "0"))
+    openai_model_limits: str = os.getenv("OPENAI_MODEL_LIMITS", "")
+    openai_concurrency_initial: int = int(os.getenv("OPENAI_CONCURRENCY_INITIAL", "8"))
+    openai_concurrency_max: int = int(os.getenv("OPENAI_CONCURRENCY_MAX", "64"))
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
 
     # SerpApi
     serpapi_key: str = os.getenv("SERPAPI_KEY", "")
     serpapi_engine: str = os.getenv("SERPAPI_ENGINE", "google")
     serpapi_location: str = os.getenv("SERPAPI_LOCATION", "India")
     serpapi_num: int = int(os.getenv("SERPAPI_NUM", "5"))
+    serpapi_url: str = os.getenv("SERPAPI_URL", "https://serpapi.com/search.json")
+
+    # Outbound HTTP pool (shared by SerpApi and OpenAI)
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    http_max_keepalive: int = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    http_timeout: float = float(os.getenv("HTTP_TIMEOUT", "60"))
+    http_http2: bool = os.getenv("HTTP_HTTP2", "1") == "1"
+
+    # Search cache (ttl 0 disables)
+    cache_db_path: str = os.getenv("CACHE_DB_PATH", ".cache/autocreator.sqlite3")
+    search_cache_ttl: int = int(os.getenv("SEARCH_CACHE_TTL", "86400"))
+    search_cache_memory_items: int = int(os.getenv("SEARCH_CACHE_MEMORY_ITEMS", "512"))
+    search_cache_disk_items: int = int(os.getenv("SEARCH_CACHE_DISK_ITEMS", "20000"))
+
+    # Draft cache (opt-in: ttl 0 disables)
+    draft_cache_ttl: int = int(os.getenv("DRAFT_CACHE_TTL", "0"))
+    draft_cache_memory_items: int = int(os.getenv("DRAFT_CACHE_MEMORY_ITEMS", "128"))
+    draft_cache_disk_items: int = int(os.getenv("DRAFT_CACHE_DISK_ITEMS", "2000"))
+
+    # Hedged drafts: start the fallback model if the primary is slow (0 delay = rolling p95)
+    draft_hedge: bool = os.getenv("DRAFT_HEDGE", "0") == "1"
+    draft_hedge_delay: float = float(os.getenv("DRAFT_HEDGE_DELAY", "0"))
+
+    # Opt-in: drafts list their own factual claims, so fact-checking an unedited draft skips extraction
+    draft_claims: bool = os.getenv("DRAFT_CLAIMS", "0") == "1"
+
+    # Bulk generation
+    bulk_concurrency: int = int(os.getenv("BULK_CONCURRENCY", "8"))
+
+    # Research pack kept per draft session and reused as fact-check evidence
+    research_session_ttl: int = int(os.getenv("RESEARCH_SESSION_TTL", "21600"))
+    research_evidence_min_confidence: float = float(os.getenv("RESEARCH_EVIDENCE_MIN_CONFIDENCE", "0.85"))
+
+    # Research prefetch: the topic form starts the search when its fields lose focus
+    research_prefetch: bool = os.getenv("RESEARCH_PREFETCH", "1") == "1"
+    research_prefetch_ttl: int = int(os.getenv("RESEARCH_PREFETCH_TTL", "600"))  # untaken after this = wasted
+    research_prefetch_max_pending: int = int(os.getenv("RESEARCH_PREFETCH_MAX_PENDING", "3"))  # untaken prefetches per client
+    research_prefetch_max_inflight: int = int(os.getenv("RESEARCH_PREFETCH_MAX_INFLIGHT", "16"))
+
+    # Fact-check
+    factcheck_concurrency: int = int(os.getenv("FACTCHECK_CONCURRENCY", "4"))
+
+    # Local evidence index (SQLite FTS5) of every fetched search result; claims it
+    # supports at EVIDENCE_MIN_CONFIDENCE with rows newer than EVIDENCE_MAX_AGE skip SerpApi
+    evidence_index: bool = os.getenv("EVIDENCE_INDEX", "1") == "1"
+    evidence_db_path: str = os.getenv("EVIDENCE_DB_PATH", ".cache/evidence.sqlite3")
+    evidence_min_confidence: float = float(os.getenv("EVIDENCE_MIN_CONFIDENCE", "0.85"))
+    evidence_max_age: int = int(os.getenv("EVIDENCE_MAX_AGE", "2592000"))  # 30 days
+    evidence_ttl: int = int(os.getenv("EVIDENCE_TTL", "7776000"))  # rows deleted after 90 days
+    evidence_max_rows: int = int(os.getenv("EVIDENCE_MAX_ROWS", "500000"))
+    evidence_candidates: int = int(os.getenv("EVIDENCE_CANDIDATES", "10"))  # rows scored per claim
+    evidence_maintain_every: int = int(os.getenv("EVIDENCE_MAINTAIN_EVERY", "1000"))  # rows added between maintenance runs
+
+    # Background fact-check jobs
+    jobs_db_path: str = os.getenv("JOBS_DB_PATH", ".cache/jobs.sqlite3")
+    factcheck_job_workers: int = int(os.getenv("FACTCHECK_JOB_WORKERS", "2"))
+    factcheck_job_ttl: int = int(os.getenv("FACTCHECK_JOB_TTL", "86400"))
 
     # Bluesky
     bluesky_handle: str = os.getenv("BLUESKY_HANDLE", "")
     bluesky_app_password: str = os.getenv("BLUESKY_APP_PASSWORD", "")
+    bluesky_base_url: str = os.getenv("BLUESKY_BASE_URL", "")  # empty = bsky.social
+    bluesky_session_dir: str = os.getenv("BLUESKY_SESSION_DIR", ".cache/bluesky")
+
+    # Request deadlines in seconds (0 = none), per route as path=seconds,...; callers
+    # can ask for less with X-Request-Timeout. Close to the deadline the pipeline
+    # degrades (no research pack, no fallback model, partial audit) instead of overrunning.
+    request_deadline: float = float(os.getenv("REQUEST_DEADLINE", "0"))
+    route_deadlines: str = os.getenv(
+        "ROUTE_DEADLINES",
+        "/topic/generate=60,/personal/generate=60,/topic/factcheck=30,/personal/factcheck=30",
+    )
+    deadline_draft_reserve: float = float(os.getenv("DEADLINE_DRAFT_RESERVE", "30"))  # research only gets what is left beyond this
+    deadline_fallback_min: float = float(os.getenv("DEADLINE_FALLBACK_MIN", "10"))  # fallback model / hedge needs this much left
+    deadline_render_reserve: float = float(os.getenv("DEADLINE_RENDER_RESERVE", "1"))  # kept back to render a partial audit
+
+    # Publish outbox: posts are queued in SQLite and sent by a background worker.
+    # Bluesky allows ~1666 record creates/hour (5000 points, 3 per create).
+    outbox_db_path: str = os.getenv("OUTBOX_DB_PATH", ".cache/outbox.sqlite3")
+    bluesky_posts_per_hour: int = int(os.getenv("BLUESKY_POSTS_PER_HOUR", "1500"))
+    bluesky_post_burst: int = int(os.getenv("BLUESKY_POST_BURST", "10"))
+    outbox_max_attempts: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+    outbox_ttl: int = int(os.getenv("OUTBOX_TTL", "604800"))  # sent/failed entries (and their idempotency keys) kept this long
+    outbox_dedupe_window: float = float(os.getenv("OUTBOX_DEDUPE_WINDOW", "300"))  # same text without a key = double click within this
+    publish_wait: float = float(os.getenv("PUBLISH_WAIT", "3"))  # seconds a publish click waits for the permalink
+
+    # Startup: WARMUP=1 imports the Bluesky SDK, builds API clients and compiles templates
+    # before serving; 0 defers all of it to first use (fastest cold start)
+    warmup: bool = os.getenv("WARMUP", "1") == "1"
+
+    # /admin/* endpoints answer only requests carrying this token (Authorization: Bearer
+    # or X-Admin-Token); empty = the endpoints are disabled (404)
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+
+    # Request profiling (opt-in; all off by default): span trees for requests sent with
+    # X-Profile: 1 (PROFILE_HEADER=1) or sampled at PROFILE_SAMPLE_RATE; with PROFILE_SLOW_MS > 0
+    # every request is recorded and kept when at least that slow. The last PROFILE_KEEP are
+    # kept in PROFILE_DIR (0 = keep all).
+    profile_header: bool = os.getenv("PROFILE_HEADER", "0") == "1"
+    profile_sample_rate: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    profile_slow_ms: float = float(os.getenv("PROFILE_SLOW_MS", "0"))
+    profile_dir: str = os.getenv("PROFILE_DIR", ".cache/profiles")
+    profile_keep: int = int(os.getenv("PROFILE_KEEP", "200"))
+
+    # Web responses: compiled templates are cached unless auto-reload is on (dev)
+    templates_auto_reload: bool = os.getenv("TEMPLATES_AUTO_RELOAD", "0") == "1"
+    gzip_min_size: int = int(os.getenv("GZIP_MIN_SIZE", "500"))
 
 settings = Settings()
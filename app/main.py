@@ -1,25 +1,227 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
+import asyncio
+import hmac
+import json
+from contextlib import asynccontextmanager
+from datetime import timezone
+from typing import AsyncIterator, Dict, List, Optional
+from fastapi import FastAPI, Request, Form, File, UploadFile, HTTPException, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from urllib.parse import urlparse
 
-from app.models.schemas import Topic, FinalizeResponse, PublishResponse
-from app.services.draft import generate_variants
+from app.models.schemas import Topic, FinalizeResponse, PublishRequest, PublishResponse, BulkGenerateRequest, BulkGenerateResult
+from app.services.draft import generate_variants_async, stream_variants, draft_cache, draft_flight, PROMPT_PREFIXES
 from app.services.finalize import finalize_text
-from app.services.publish import publish_bluesky
-from app.services.factcheck import audit_text, serpapi_search
+from app.services.publish import load_sdk
+from app.services.outbox import publish_outbox, as_response
+from app.services.factcheck import audit_text_async, search_cache, search_flight, claims_flight, CLAIMS_PREFIX
+from app.services.clients import open_clients, aclose_clients, openai_client, async_openai_client
+from app.services.evidence import local_evidence
+from app.services.research import research_pack, research_prefetcher, research_store, save_research, load_research
+from app.services.bulk import run_bulk, parse_topics_csv
+from app.services.jobs import factcheck_jobs
+from app.services.scheduler import openai_scheduler
+from app.services.hedge import hedger
+from app.services.tokens import count_tokens
+from app.services.metrics import CONTENT_TYPE, TEMPLATE_RENDER, MetricsMiddleware, render_latest
+from app.services.compression import CompressionMiddleware
+from app.services.deadline import DeadlineMiddleware
+from app.services.profiling import ProfilingMiddleware, collapsed, profile_store, span
+from app.services import deadline
+from app.config import settings
 
-app = FastAPI(title="AutoCreator")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_clients()
+    if settings.warmup:
+        await asyncio.to_thread(warm_up)
+    factcheck_jobs.resume()
+    publish_outbox.start()
+    local_evidence.start()
+    yield
+    await local_evidence.shutdown()
+    await publish_outbox.shutdown()
+    await research_prefetcher.shutdown()
+    await factcheck_jobs.shutdown()
+    await aclose_clients()
+
+app = FastAPI(title="AutoCreator", lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)  # added last = outermost, so it sees compressed responses' timing too
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.auto_reload = settings.templates_auto_reload
+
+def precompile_templates() -> None:
+    # fill Jinja's template cache up front; with auto_reload off nothing is re-read or re-compiled
+    for name in templates.env.list_templates(extensions=["html"]):
+        templates.env.get_template(name)
+
+def warm_up() -> None:
+    """
+    One-off costs paid before the first request instead of during it.
+    """
+    load_sdk()
+    openai_client()
+    async_openai_client()
+    count_tokens("warm up")  # loads the tiktoken encoding when installed
+    precompile_templates()
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def _personal_background(role, situation, challenge, action, result, lesson, headline) -> str:
+    # build background block from structured fields
+    background_parts = []
+    if role: background_parts.append(f"Role: {role}")
+    if situation: background_parts.append(f"Context: {situation}")
+    if challenge: background_parts.append(f"Challenge: {challenge}")
+    if action: background_parts.append(f"Action: {action}")
+    if result: background_parts.append(f"Result: {result}")
+    if lesson: background_parts.append(f"Lesson: {lesson}")
+    if headline: background_parts.append(f"Hook Hint: {headline}")
+    return "\n".join(background_parts) if background_parts else "N/A"
+
+def _personal_title(role: str, situation: str, headline: str) -> str:
+    # topic title is derived from headline or role/situation
+    return headline or f"{role} — {situation}".strip(" —")
+
+def render(name: str, ctx: Dict, fragment: Optional[str] = None):
+    """
+    Render a page, or with an X-Fragment request header just the named panel
+    (templates/partials/<fragment>.html) for the page script to swap in.
+    """
+    ctx.setdefault("flow", name.rsplit(".", 1)[0])
+    ctx.setdefault("degraded", deadline.degradations())
+    partial = bool(fragment and ctx["request"].headers.get("x-fragment"))
+    label = f"partials/{fragment}.html" if partial else name
+    # TemplateResponse renders eagerly, so this times the Jinja render itself
+    with TEMPLATE_RENDER.time(template=label), span(f"render {label}"):
+        if partial:
+            resp = templates.TemplateResponse("partials/fragment.html", {**ctx, "fragment": fragment})
+            resp.headers["X-Fragment"] = fragment
+        else:
+            resp = templates.TemplateResponse(name, ctx)
+    if fragment:
+        resp.headers["Vary"] = "X-Fragment"
+    return resp
+
+def _job_audits(job_id: str) -> Optional[List[Dict]]:
+    # a finished background fact-check: the page rendered its claims while polling
+    # and only asks for the finalized panel (with publish gating) built from them
+    job = factcheck_jobs.get(job_id) if job_id else None
+    if job is None or job["status"] != "done":
+        return None
+    return [a for a in job["audits"] if a is not None]
+
+async def _research(topic: str, angle: str):
+    # research is optional: when it would eat into the time the draft needs, draft without it
+    try:
+        return await deadline.bounded(research_pack(topic, angle), "research", reserve=settings.deadline_draft_reserve)
+    except deadline.DeadlineExceeded:
+        deadline.degrade("no_research")
+        return [], ""
+
+async def _publish(text: str) -> PublishResponse:
+    # queue, then give the outbox a moment so the usual case still shows the permalink
+    entry = publish_outbox.submit(text)
+    return as_response(await publish_outbox.wait(entry["id"], settings.publish_wait))
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _sse_variants(events: AsyncIterator[Dict]) -> AsyncIterator[str]:
+    try:
+        async for ev in events:
+            if ev["type"] == "variant":
+                yield _sse("variant", {"index": ev["index"], **ev["variant"].model_dump()})
+            else:
+                yield _sse(ev["type"], {k: v for k, v in ev.items() if k != "type"})
+        yield _sse("done", {})
+    except Exception as e:
+        yield _sse("error", {"message": str(e)})
+
+async def _ndjson(results: AsyncIterator[BulkGenerateResult]) -> AsyncIterator[str]:
+    async for r in results:
+        yield r.model_dump_json() + "\n"
+
+def _sse_response(body: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ---------------------------
 # Home
 # ---------------------------
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    return templates.TemplateResponse("home.html", {"request": request})
+    return render("home.html", {"request": request})
+
+# ---------------------------
+# Admin
+# ---------------------------
+@app.get("/metrics")
+async def metrics():
+    return Response(render_latest(), media_type=CONTENT_TYPE)
+
+def require_admin(request: Request) -> None:
+    """
+    Admin endpoints need ADMIN_TOKEN (Authorization: Bearer or X-Admin-Token);
+    without one configured they don't exist.
+    """
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    auth = request.headers.get("authorization", "")
+    given = auth[7:] if auth.lower().startswith("bearer ") else request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(given.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/admin/cache", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+async def admin_cache():
+    return {
+        "caches": [search_cache.stats(), draft_cache.stats(), research_store.stats()],
+        "coalescing": [search_flight.stats(), claims_flight.stats(), draft_flight.stats()],
+        "evidence": local_evidence.stats(),
+        "prefetch": research_prefetcher.stats(),
+    }
+
+@app.get("/admin/outbox", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+async def admin_outbox():
+    return publish_outbox.stats()
+
+@app.get("/admin/profiles", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+async def admin_profiles():
+    return {"profiles": profile_store.list()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def admin_profile(profile_id: str, format: str = "json"):
+    """
+    One saved profile: the span tree (json) or collapsed stacks for flamegraph
+    tools (format=collapsed, e.g. `flamegraph.pl profile.folded > profile.svg`).
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    if format == "collapsed":
+        return Response(collapsed(profile["tree"]), media_type="text/plain; charset=utf-8",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'})
+    return JSONResponse(profile, headers={"Content-Disposition": f'attachment; filename="{profile_id}.json"'})
+
+@app.get("/admin/openai", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+async def admin_openai():
+    return {
+        "models": openai_scheduler.stats(),
+        "hedging": hedger.stats(),
+        # providers only cache prefixes of >= 1024 tokens
+        "static_prefix_tokens": {
+            **{f"draft_{mode}": count_tokens(p) for mode, p in PROMPT_PREFIXES.items()},
+            "claims": count_tokens(CLAIMS_PREFIX),
+        },
+    }
 
 # ===========================
 # TOPIC FLOW
@@ -34,7 +236,7 @@ async def topic_new(request: Request):
         "include_sources": "1",
         "variants": None,
     }
-    return templates.TemplateResponse("topic.html", ctx)
+    return render("topic.html", ctx)
 
 @app.post("/topic/generate", response_class=HTMLResponse)
 async def topic_generate(
@@ -45,25 +247,21 @@ async def topic_generate(
     length: str = Form("medium"),
     use_research: str = Form("0"),
     include_sources: str = Form("1"),
+    fresh: str = Form("0"),
 ):
     error = None
     variants = None
     sources_used = []
     sources_domains = ""
+    research_token = ""
 
     try:
         if use_research == "1":
-            q = f"{topic} {angle}".strip()
-            sources_used = serpapi_search(q, num=5)
-            # Build de-duped domains string
-            domains = []
-            for s in sources_used:
-                d = urlparse(s.get("url", "")).netloc.replace("www.", "")
-                if d and d not in domains:
-                    domains.append(d)
-            sources_domains = "; ".join(domains[:3])
-
-        variants = generate_variants(
+            sources_used, sources_domains = await _research(topic, angle)
+            if sources_used:
+                research_token = save_research(sources_used)
+
+        variants = await generate_variants_async(
             Topic(title=topic, angle=angle),
             platform=platform,
             n=3,
@@ -71,6 +269,7 @@ async def topic_generate(
             background=None,
             length=length,
             research_sources=sources_used,
+            fresh=fresh == "1",
         )
     except Exception as e:
         error = str(e)
@@ -85,10 +284,61 @@ async def topic_generate(
         "include_sources": include_sources,
         "sources_used": sources_used,
         "sources_domains": sources_domains,
+        "research_token": research_token,
         "variants": variants,
         "error": error,
     }
-    return templates.TemplateResponse("topic.html", ctx)
+    return render("topic.html", ctx, fragment="variants")
+
+@app.post("/topic/prefetch", status_code=202)
+async def topic_prefetch(
+    request: Request,
+    topic: str = Form(""),
+    angle: str = Form(""),
+    client_id: str = Form("", max_length=64),
+):
+    # called by the form as its fields lose focus; the generate call picks the result up.
+    # The pending cap is per form session (client_id), not per address: behind a
+    # proxy every browser shares one (run uvicorn with --proxy-headers to see theirs)
+    client = client_id or (request.client.host if request.client else "")
+    return {"status": research_prefetcher.start(topic, angle, client)}
+
+@app.post("/topic/generate/stream")
+async def topic_generate_stream(
+    topic: str = Form(...),
+    angle: str = Form(""),
+    platform: str = Form("linkedin"),
+    length: str = Form("medium"),
+    use_research: str = Form("0"),
+    fresh: str = Form("0"),
+):
+    async def body() -> AsyncIterator[str]:
+        sources_used: List[Dict] = []
+        if use_research == "1":
+            try:
+                sources_used, sources_domains = await _research(topic, angle)
+            except Exception as e:
+                yield _sse("error", {"message": str(e)})
+                return
+            yield _sse("sources", {
+                "sources": sources_used,
+                "sources_domains": sources_domains,
+                "research_token": save_research(sources_used),
+            })
+        events = stream_variants(
+            Topic(title=topic, angle=angle),
+            platform=platform,
+            n=3,
+            mode="topical",
+            background=None,
+            length=length,
+            research_sources=sources_used,
+            fresh=fresh == "1",
+        )
+        async for chunk in _sse_variants(events):
+            yield chunk
+
+    return _sse_response(body())
 
 @app.post("/topic/factcheck", response_class=HTMLResponse)
 async def topic_factcheck(
@@ -101,12 +351,15 @@ async def topic_factcheck(
     use_research: str = Form("0"),
     include_sources: str = Form("1"),
     sources_domains: str = Form(""),
+    research_token: str = Form(""),
+    job_id: str = Form(""),
 ):
-    audits, error = [], None
-    try:
-        audits = audit_text(text)
-    except Exception as e:
-        error = str(e)
+    audits, error = _job_audits(job_id), None
+    if audits is None:
+        try:
+            audits = await audit_text_async(text, evidence=load_research(research_token))
+        except Exception as e:
+            audits, error = [], str(e)
 
     ctx = {
         "request": request,
@@ -117,13 +370,14 @@ async def topic_factcheck(
         "use_research": use_research,
         "include_sources": include_sources,
         "sources_domains": sources_domains,
+        "research_token": research_token,
         "final_text": text,
         "audits": audits,
         "audit_count": len(audits),
         "fact_checked": True,
         "error": error,
     }
-    return templates.TemplateResponse("topic.html", ctx)
+    return render("topic.html", ctx, fragment="finalized" if job_id else "factcheck")
 
 @app.post("/topic/finalize", response_class=HTMLResponse)
 async def topic_finalize(
@@ -132,15 +386,16 @@ async def topic_finalize(
     platform: str = Form(...),
     include_sources: str = Form("1"),
     sources_domains: str = Form(""),
+    research_token: str = Form(""),
 ):
     fin = finalize_text(text, platform, sources_domains if include_sources == "1" else None)
-    ctx = {"request": request, "final_text": fin.final_text, "platform": platform}
-    return templates.TemplateResponse("topic.html", ctx)
+    ctx = {"request": request, "final_text": fin.final_text, "platform": platform, "research_token": research_token}
+    return render("topic.html", ctx, fragment="finalized")
 
 @app.post("/topic/publish/bluesky", response_class=HTMLResponse)
 async def topic_publish_bsky(request: Request, text: str = Form(...)):
-    res = publish_bluesky(text)
-    return templates.TemplateResponse("topic.html", {"request": request, "publish": res, "final_text": text, "platform": "bluesky"})
+    res = await _publish(text)
+    return render("topic.html", {"request": request, "publish": res, "final_text": text, "platform": "bluesky"}, fragment="publish")
 
 # ===========================
 # PERSONAL FLOW
@@ -153,7 +408,7 @@ async def personal_new(request: Request):
         "length": "medium",
         "variants": None,
     }
-    return templates.TemplateResponse("personal.html", ctx)
+    return render("personal.html", ctx)
 
 @app.post("/personal/generate", response_class=HTMLResponse)
 async def personal_generate(
@@ -167,25 +422,16 @@ async def personal_generate(
     result: str = Form(""),
     lesson: str = Form(""),
     headline: str = Form(""),
+    fresh: str = Form("0"),
 ):
     error = None
     variants = None
 
-    # build background block from structured fields
-    background_parts = []
-    if role: background_parts.append(f"Role: {role}")
-    if situation: background_parts.append(f"Context: {situation}")
-    if challenge: background_parts.append(f"Challenge: {challenge}")
-    if action: background_parts.append(f"Action: {action}")
-    if result: background_parts.append(f"Result: {result}")
-    if lesson: background_parts.append(f"Lesson: {lesson}")
-    if headline: background_parts.append(f"Hook Hint: {headline}")
-    background = "\n".join(background_parts) if background_parts else "N/A"
+    background = _personal_background(role, situation, challenge, action, result, lesson, headline)
 
     try:
-        # topic title is derived from headline or role/situation
-        title = headline or f"{role} — {situation}".strip(" —")
-        variants = generate_variants(
+        title = _personal_title(role, situation, headline)
+        variants = await generate_variants_async(
             Topic(title=title, angle=""),
             platform=platform,
             n=3,
@@ -193,6 +439,7 @@ async def personal_generate(
             background=background,
             length=length,
             research_sources=None,
+            fresh=fresh == "1",
         )
     except Exception as e:
         error = str(e)
@@ -211,19 +458,46 @@ async def personal_generate(
         "lesson": lesson,
         "headline": headline,
     }
-    return templates.TemplateResponse("personal.html", ctx)
+    return render("personal.html", ctx, fragment="variants")
+
+@app.post("/personal/generate/stream")
+async def personal_generate_stream(
+    platform: str = Form("linkedin"),
+    length: str = Form("medium"),
+    role: str = Form(""),
+    situation: str = Form(""),
+    challenge: str = Form(""),
+    action: str = Form(""),
+    result: str = Form(""),
+    lesson: str = Form(""),
+    headline: str = Form(""),
+    fresh: str = Form("0"),
+):
+    events = stream_variants(
+        Topic(title=_personal_title(role, situation, headline), angle=""),
+        platform=platform,
+        n=3,
+        mode="personal",
+        background=_personal_background(role, situation, challenge, action, result, lesson, headline),
+        length=length,
+        research_sources=None,
+        fresh=fresh == "1",
+    )
+    return _sse_response(_sse_variants(events))
 
 @app.post("/personal/factcheck", response_class=HTMLResponse)
 async def personal_factcheck(
     request: Request,
     text: str = Form(...),
     platform: str = Form("linkedin"),
+    job_id: str = Form(""),
 ):
-    audits, error = [], None
-    try:
-        audits = audit_text(text)  # personal posts can still be fact-checked
-    except Exception as e:
-        error = str(e)
+    audits, error = _job_audits(job_id), None
+    if audits is None:
+        try:
+            audits = await audit_text_async(text)  # personal posts can still be fact-checked
+        except Exception as e:
+            audits, error = [], str(e)
 
     ctx = {
         "request": request,
@@ -234,7 +508,7 @@ async def personal_factcheck(
         "fact_checked": True,
         "error": error,
     }
-    return templates.TemplateResponse("personal.html", ctx)
+    return render("personal.html", ctx, fragment="finalized" if job_id else "factcheck")
 
 @app.post("/personal/finalize", response_class=HTMLResponse)
 async def personal_finalize(
@@ -244,9 +518,66 @@ async def personal_finalize(
 ):
     fin = finalize_text(text, platform, None)  # no sources line for personal by default
     ctx = {"request": request, "final_text": fin.final_text, "platform": platform}
-    return templates.TemplateResponse("personal.html", ctx)
+    return render("personal.html", ctx, fragment="finalized")
 
 @app.post("/personal/publish/bluesky", response_class=HTMLResponse)
 async def personal_publish_bsky(request: Request, text: str = Form(...)):
-    res = publish_bluesky(text)
-    return templates.TemplateResponse("personal.html", {"request": request, "publish": res, "final_text": text, "platform": "bluesky"})
+    res = await _publish(text)
+    return render("personal.html", {"request": request, "publish": res, "final_text": text, "platform": "bluesky"}, fragment="publish")
+
+# ===========================
+# FACT-CHECK JOBS (submit, then poll)
+# ===========================
+@app.post("/factcheck/jobs", status_code=202)
+async def factcheck_job_submit(text: str = Form(...), research_token: str = Form("")):
+    return {"job_id": factcheck_jobs.submit(text, research_token or None)}
+
+@app.get("/factcheck/jobs/{job_id}")
+async def factcheck_job_status(job_id: str):
+    job = factcheck_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown fact-check job")
+    return job
+
+# ===========================
+# PUBLISH API (outbox: submit, then poll)
+# ===========================
+@app.post("/api/publish", status_code=202)
+async def api_publish(req: PublishRequest, request: Request):
+    if req.platform != "bluesky":
+        raise HTTPException(status_code=422, detail="Only bluesky publishing is supported")
+    publish_at = req.publish_at
+    if publish_at is not None and publish_at.tzinfo is None:
+        publish_at = publish_at.replace(tzinfo=timezone.utc)
+    return publish_outbox.submit(
+        req.text,
+        publish_at=publish_at.timestamp() if publish_at else None,
+        key=req.idempotency_key or request.headers.get("idempotency-key"),
+    )
+
+@app.get("/api/publish/{entry_id}")
+async def api_publish_status(entry_id: str):
+    entry = publish_outbox.get(entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown outbox entry")
+    return entry
+
+# ===========================
+# BULK API (JSON in, NDJSON out)
+# ===========================
+@app.post("/api/generate/bulk")
+async def api_generate_bulk(req: BulkGenerateRequest):
+    return StreamingResponse(_ndjson(run_bulk(req.items, req.concurrency)), media_type="application/x-ndjson")
+
+@app.post("/api/generate/bulk/csv")
+async def api_generate_bulk_csv(file: UploadFile = File(...), concurrency: int = Form(0, ge=0, le=50)):  # 0 = BULK_CONCURRENCY
+    raw = await file.read()
+    try:
+        items = parse_topics_csv(raw.decode("utf-8-sig"))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="CSV must be UTF-8 encoded")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=422, detail="CSV has no topics")
+    return StreamingResponse(_ndjson(run_bulk(items, concurrency or None)), media_type="application/x-ndjson")
@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
@@ -9,15 +10,34 @@ class DraftVariant(BaseModel):
     variant: int
     text: str
     rationale: Optional[str] = None
+    claims: Optional[List[str]] = None  # facts the model says it put in `text` (DRAFT_CLAIMS)
 
 class GenerateDraftRequest(BaseModel):
     topic: Topic
     platform: str = Field(default="linkedin")
     variants: int = Field(default=3, ge=1, le=5)
+    length: str = Field(default="medium")
+    use_research: bool = False
+    fresh: bool = False
 
 class GenerateDraftResponse(BaseModel):
     variants: List[DraftVariant]
 
+class BulkGenerateRequest(BaseModel):
+    items: List[GenerateDraftRequest] = Field(min_length=1, max_length=1000)
+    concurrency: Optional[int] = Field(default=None, ge=1, le=50)
+
+class BulkGenerateResult(BaseModel):
+    index: int
+    topic: Topic
+    ok: bool
+    variants: List[DraftVariant] = Field(default_factory=list)
+    sources_domains: Optional[str] = None
+    error: Optional[str] = None
+    research_ms: Optional[int] = None
+    generate_ms: Optional[int] = None
+    elapsed_ms: int = 0
+
 class FinalizeRequest(BaseModel):
     text: str
     platform: str
@@ -26,10 +46,13 @@ class FinalizeResponse(BaseModel):
     final_text: str
 
 class PublishRequest(BaseModel):
-    platform: str
-    text: str
+    platform: str = "bluesky"
+    text: str = Field(min_length=1)
+    publish_at: Optional[datetime] = None  # scheduled post; naive times are UTC
+    idempotency_key: Optional[str] = Field(default=None, max_length=200)  # default: hash of handle + text
 
 class PublishResponse(BaseModel):
     ok: bool
     permalink: Optional[str] = None
     message: Optional[str] = None
+    outbox_id: Optional[str] = None  # set while the post waits in the outbox
@@ -0,0 +1,87 @@
+# app/services/bulk.py
+import asyncio
+import csv
+import io
+import time
+from typing import AsyncIterator, List, Optional
+from app.config import settings
+from app.models.schemas import Topic, GenerateDraftRequest, BulkGenerateResult
+from app.services.draft import generate_variants_async
+from app.services.research import research_pack
+from app.services.scheduler import BULK, priority
+
+TRUTHY = {"1", "true", "yes", "y"}
+
+def parse_topics_csv(raw: str) -> List[GenerateDraftRequest]:
+    """
+    CSV with a header row. Only `topic` (or `title`) is required; optional columns:
+    angle, platform, length, variants, use_research, fresh.
+    """
+    reader = csv.DictReader(io.StringIO(raw))
+    items: List[GenerateDraftRequest] = []
+    for line, row in enumerate(reader, start=2):
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        title = row.get("topic") or row.get("title")
+        if not title:
+            raise ValueError(f"CSV line {line}: missing topic")
+        items.append(GenerateDraftRequest(
+            topic=Topic(title=title, angle=row.get("angle") or None),
+            platform=row.get("platform") or "linkedin",
+            length=row.get("length") or "medium",
+            variants=int(row.get("variants") or 3),
+            use_research=row.get("use_research", "").lower() in TRUTHY,
+            fresh=row.get("fresh", "").lower() in TRUTHY,
+        ))
+    return items
+
+def _ms(start: float) -> int:
+    return int((time.perf_counter() - start) * 1000)
+
+async def _generate_one(index: int, req: GenerateDraftRequest) -> BulkGenerateResult:
+    started = time.perf_counter()
+    out = BulkGenerateResult(index=index, topic=req.topic, ok=False)
+    try:
+        sources, domains = [], None
+        if req.use_research:
+            t = time.perf_counter()
+            sources, domains = await research_pack(req.topic.title, req.topic.angle or "")
+            out.research_ms = _ms(t)
+            out.sources_domains = domains
+        t = time.perf_counter()
+        out.variants = await generate_variants_async(
+            req.topic,
+            platform=req.platform,
+            n=req.variants,
+            mode="topical",
+            background=None,
+            length=req.length,
+            research_sources=sources,
+            fresh=req.fresh,
+        )
+        out.generate_ms = _ms(t)
+        out.ok = True
+    except Exception as e:
+        out.error = str(e)
+    out.elapsed_ms = _ms(started)
+    return out
+
+async def run_bulk(items: List[GenerateDraftRequest], concurrency: Optional[int] = None) -> AsyncIterator[BulkGenerateResult]:
+    """
+    Generate every item with at most `concurrency` in flight, yielding results
+    in completion order (each carries its input `index`). Closing the iterator
+    (e.g. the client went away) cancels the work still pending.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency or settings.bulk_concurrency))
+
+    async def bounded(i: int, req: GenerateDraftRequest) -> BulkGenerateResult:
+        async with sem:
+            return await _generate_one(i, req)
+
+    with priority(BULK):  # tasks copy the context: their OpenAI calls queue behind interactive ones
+        tasks = [asyncio.create_task(bounded(i, req)) for i, req in enumerate(items)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
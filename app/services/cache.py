@@ -0,0 +1,161 @@
+# app/services/cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from app.services.store import LocalDB
+from app.services.metrics import CACHE_LOOKUPS
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+    expires_at REAL NOT NULL, accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at);
+"""
+
+def normalize_query(q: str) -> str:
+    """
+    Lowercase, NFKC, collapse whitespace and drop trailing punctuation so
+    "NASA  rovers?" and "nasa rovers" share a cache entry.
+    """
+    q = unicodedata.normalize("NFKC", q or "").lower()
+    return " ".join(q.split()).strip(" .,:;!?")
+
+def make_key(*parts: Any) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class TieredCache:
+    """
+    Two-tier TTL cache: an in-process LRU in front of a SQLite table that all
+    uvicorn workers on the box share. Values must be JSON-serialisable.
+    ttl <= 0 disables the cache (get always misses, set is a no-op).
+    """
+
+    def __init__(self, namespace: str, path: str, ttl: float, max_memory: int = 256, max_disk: int = 5000):
+        self.namespace = namespace
+        self.path = path
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = LocalDB(path, CACHE_SCHEMA)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    # ---------------------------
+    # SQLite tier
+    # ---------------------------
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.conn()
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace=? AND key=?",
+            (self.namespace, key),
+        ).fetchone()
+        if not row:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM cache WHERE namespace=? AND key=?", (self.namespace, key))
+            return None
+        conn.execute(
+            "UPDATE cache SET accessed_at=? WHERE namespace=? AND key=?",
+            (now, self.namespace, key),
+        )
+        return json.loads(row[0]), row[1]
+
+    def _disk_set(self, key: str, value: Any, expires_at: float, now: float) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at) VALUES (?,?,?,?,?)",
+            (self.namespace, key, json.dumps(value, ensure_ascii=False), expires_at, now),
+        )
+        # size-based eviction: keep the max_disk most recently used rows
+        conn.execute(
+            "DELETE FROM cache WHERE namespace=? AND key IN ("
+            " SELECT key FROM cache WHERE namespace=? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_disk),
+        )
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(cache=self.namespace, result="hit")
+                    return entry[0]
+                del self._mem[key]
+        try:
+            entry = self._disk_get(key, now)
+        except sqlite3.Error:
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache=self.namespace, result="miss")
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._mem_put(key, entry)
+        CACHE_LOOKUPS.inc(cache=self.namespace, result="disk_hit")
+        return entry[0]
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._mem_put(key, (value, expires_at))
+        try:
+            self._disk_set(key, value, expires_at, now)
+        except sqlite3.Error:
+            pass  # disk tier is best-effort; memory tier still serves this worker
+
+    def _mem_put(self, key: str, entry: tuple) -> None:
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory:
+            self._mem.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+        try:
+            self._conn().execute("DELETE FROM cache WHERE namespace=?", (self.namespace,))
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "memory_items": len(self._mem),
+        }
@@ -0,0 +1,91 @@
+# app/services/clients.py
+import threading
+from typing import Optional
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from app.config import settings
+
+# One pooled transport per flavour (sync for scripts/threads, async for routes).
+# httpx can't share a pool between the two, so "shared" means: every outbound
+# call of that flavour - SerpApi and OpenAI alike - reuses the same keep-alive pool.
+_lock = threading.Lock()
+_http: Optional[httpx.Client] = None
+_ahttp: Optional[httpx.AsyncClient] = None
+_oai: Optional[OpenAI] = None
+_aoai: Optional[AsyncOpenAI] = None
+_bound: dict = {}
+
+def _http2_enabled() -> bool:
+    if not settings.http_http2:
+        return False
+    try:
+        import h2  # noqa: F401  (httpx[http2] extra)
+        return True
+    except ImportError:
+        return False
+
+def _client_kwargs() -> dict:
+    return {
+        "http2": _http2_enabled(),
+        "timeout": httpx.Timeout(settings.http_timeout, connect=10.0),
+        "limits": httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+    }
+
+def http_client() -> httpx.Client:
+    global _http
+    if _http is None or _http.is_closed:
+        with _lock:
+            if _http is None or _http.is_closed:
+                _http = httpx.Client(**_client_kwargs())
+    return _http
+
+def async_http_client() -> httpx.AsyncClient:
+    global _ahttp
+    if _ahttp is None or _ahttp.is_closed:
+        with _lock:
+            if _ahttp is None or _ahttp.is_closed:
+                _ahttp = httpx.AsyncClient(**_client_kwargs())
+    return _ahttp
+
+def openai_client() -> OpenAI:
+    global _oai
+    http = http_client()
+    with _lock:
+        # rebuilt if the pool was closed and reopened since
+        if _oai is None or _bound.get("sync") is not http:
+            _oai = OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None,
+                          http_client=http, max_retries=0)  # retries live in scheduler.py
+            _bound["sync"] = http
+        return _oai
+
+def async_openai_client() -> AsyncOpenAI:
+    global _aoai
+    http = async_http_client()
+    with _lock:
+        if _aoai is None or _bound.get("async") is not http:
+            _aoai = AsyncOpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None,
+                                http_client=http, max_retries=0)
+            _bound["async"] = http
+        return _aoai
+
+def open_clients() -> None:
+    """
+    Called from the FastAPI lifespan so the pools exist before the first request.
+    """
+    http_client()
+    async_http_client()
+
+async def aclose_clients() -> None:
+    global _http, _ahttp, _oai, _aoai
+    with _lock:
+        http, ahttp = _http, _ahttp
+        _http = _ahttp = _oai = _aoai = None
+        _bound.clear()
+    if ahttp is not None:
+        await ahttp.aclose()
+    if http is not None:
+        http.close()
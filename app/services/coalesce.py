@@ -0,0 +1,120 @@
+# app/services/coalesce.py
+import asyncio
+import contextvars
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.services import deadline, profiling
+from app.services.metrics import COALESCED_CALLS
+
+class _Call:
+    __slots__ = ("task", "waiters", "deadline")
+
+    def __init__(self, task: asyncio.Task, shared: deadline.Deadline):
+        self.task = task
+        self.waiters = 0
+        self.deadline = shared
+
+def _shared_context(shared: deadline.Deadline) -> contextvars.Context:
+    # the shared call belongs to no single caller: not the first one's deadline
+    # or profile span
+    ctx = contextvars.copy_context()
+    ctx.run(deadline.attach, shared)
+    ctx.run(profiling.detach)
+    return ctx
+
+class _SyncCall:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """
+    Concurrent callers with the same key share one in-flight call ("singleflight").
+    The shared call runs as its own task, so a caller that is cancelled (client
+    went away) doesn't cancel it for the others; it is cancelled once no caller
+    is left. Its deadline is that of the caller with the most time left
+    (deadline.share); each caller still bounds its own wait and records what
+    the shared call degraded.
+    Errors reach every caller but are not remembered: the next call
+    after a failure starts over. Results are not kept either - that's the caches'
+    job; this only covers the window while the call is in flight.
+    """
+
+    def __init__(self, op: str):
+        self.op = op
+        self._calls: Dict[str, _Call] = {}
+        self._sync: Dict[str, _SyncCall] = {}
+        self._lock = threading.Lock()  # sync path only; the async path stays on one loop
+        self.calls = 0
+        self.joined = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            shared = deadline.share()
+            call = _Call(_shared_context(shared).run(asyncio.ensure_future, fn()), shared)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, key=key, call=call: self._forget(key, call))
+            self.calls += 1
+        else:
+            call.deadline.widen(deadline.current())
+            self.joined += 1
+            COALESCED_CALLS.inc(op=self.op)
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            for kind in call.deadline.degraded:
+                deadline.degrade(kind)
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # every caller is gone (cancelled): stop the upstream call, and
+                # make sure nobody new joins a call that is being cancelled
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def do_sync(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Blocking twin of do() for scripts and thread pools.
+        """
+        with self._lock:
+            call = self._sync.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync[key] = _SyncCall()
+                self.calls += 1
+            else:
+                self.joined += 1
+        if not leader:
+            COALESCED_CALLS.inc(op=self.op)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync[key]
+            call.done.set()
+
+    def stats(self) -> Dict:
+        total = self.calls + self.joined
+        return {
+            "op": self.op,
+            "upstream_calls": self.calls,
+            "coalesced": self.joined,
+            "saved_rate": round(self.joined / total, 4) if total else 0.0,
+            "in_flight": len(self._calls) + len(self._sync),
+        }
@@ -0,0 +1,97 @@
+# app/services/compression.py
+import gzip
+from typing import List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from app.config import settings
+
+try:
+    import brotli  # optional; gzip only without it
+except ImportError:
+    brotli = None
+
+# Whole-body responses only (pages, fragments, JSON). Anything sent in several
+# chunks (SSE, NDJSON, file downloads) goes out untouched so each chunk reaches
+# the client as soon as it is written.
+_COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+def _accepted(accept_encoding: str) -> List[str]:
+    """
+    Codings from an Accept-Encoding header with a non-zero q-value.
+    """
+    out = []
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            out.append(coding)
+    return out
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=4)  # fast setting; pages are small
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+class CompressionMiddleware:
+    """
+    Pure ASGI, like MetricsMiddleware: compresses single-message responses of
+    at least GZIP_MIN_SIZE bytes with br (when brotli is installed) or gzip.
+    """
+
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.gzip_min_size if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        passthrough = False
+
+        async def wrapped(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message  # held until we know the body
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            passthrough = True  # decided on the first body message
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            if message.get("more_body") or not self._compressible(headers, body):
+                await send(start)
+                await send(message)
+                return
+            body = compress(body, coding)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped)
+
+    def _compressible(self, headers: MutableHeaders, body: bytes) -> bool:
+        if len(body) < self.minimum_size or "content-encoding" in headers:
+            return False
+        ctype = headers.get("content-type", "")
+        return ctype.startswith(_COMPRESSIBLE) and not ctype.startswith("text/event-stream")
@@ -0,0 +1,171 @@
+# app/services/deadline.py
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, List, Optional
+from app.config import settings
+from app.services.metrics import DEADLINES_EXCEEDED, DEGRADATIONS
+
+# One time budget per request, set by DeadlineMiddleware and read through a
+# context variable by every service call below the route (tasks it spawns
+# inherit it too). Stages look at what is left before starting work and
+# degrade instead of overrunning: no research pack, no fallback model, a
+# partial audit. What was dropped is recorded on the Deadline, shown in the
+# response and counted.
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class Deadline:
+    def __init__(self, seconds: Optional[float], shared: bool = False):
+        self.seconds = seconds
+        self.expires = None if seconds is None else time.monotonic() + seconds  # None: no limit
+        self.degraded: List[str] = []
+        self.shared = shared
+
+    def remaining(self) -> Optional[float]:
+        return None if self.expires is None else self.expires - time.monotonic()
+
+    def widen(self, other: Optional["Deadline"]) -> None:
+        # a shared call has as long as the caller with the most time left
+        if self.expires is not None:
+            self.expires = None if other is None or other.expires is None else max(self.expires, other.expires)
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    Run the enclosed calls within `seconds` (None or <= 0: no deadline).
+    """
+    token = _current.set(Deadline(seconds) if seconds and seconds > 0 else None)
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+def detach() -> None:
+    # for background work started by a request that must outlive it (fact-check jobs)
+    _current.set(None)
+
+def share() -> Deadline:
+    """
+    Deadline for a call several requests share (SingleFlight): starts as the
+    current request's, is widened by each request that joins, and collects
+    the call's degradations for every one of them to record.
+    """
+    caller = _current.get()
+    d = Deadline(None, shared=True)
+    d.expires = None if caller is None else caller.expires
+    return d
+
+def attach(d: Optional[Deadline]) -> None:
+    _current.set(d)
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left in the current request's budget; None when it has none.
+    """
+    d = _current.get()
+    return None if d is None else d.remaining()
+
+def has_time(seconds: float) -> bool:
+    left = remaining()
+    return left is None or left >= seconds
+
+def timeout(default: float) -> float:
+    """
+    Per-call timeout for an upstream request: `default`, cut to what is left.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(default, left)
+
+async def bounded(aw: Awaitable[Any], op: str, reserve: float = 0.0) -> Any:
+    """
+    Await `aw`, giving up (DeadlineExceeded) once all but `reserve` seconds of
+    the budget are gone. Without a deadline this is a plain await.
+    """
+    left = remaining()
+    if left is None:
+        return await aw
+    budget = left - reserve
+    if budget > 0:
+        try:
+            return await asyncio.wait_for(aw, budget)
+        except asyncio.TimeoutError:
+            pass
+    elif asyncio.iscoroutine(aw):
+        aw.close()  # no time to start it at all
+    elif asyncio.isfuture(aw):
+        aw.cancel()
+    DEADLINES_EXCEEDED.inc(op=op)
+    raise DeadlineExceeded(f"request deadline exceeded during {op}")
+
+def degrade(kind: str) -> None:
+    """
+    Record that the response was reduced (`kind`) to stay within the deadline.
+    """
+    d = _current.get()
+    if d is None or not d.shared:
+        DEGRADATIONS.inc(kind=kind)  # a shared call's are counted by each caller instead
+    if d is not None and kind not in d.degraded:
+        d.degraded.append(kind)
+
+def degradations() -> List[str]:
+    d = _current.get()
+    return list(d.degraded) if d is not None else []
+
+def _route_deadlines() -> Dict[str, float]:
+    """
+    ROUTE_DEADLINES="/topic/generate=60,/topic/factcheck=30" (path=seconds).
+    """
+    out: Dict[str, float] = {}
+    for entry in settings.route_deadlines.split(","):
+        path, _, seconds = entry.strip().partition("=")
+        if path and seconds:
+            out[path] = float(seconds)
+    return out
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware: starts each request's deadline from ROUTE_DEADLINES, or
+    REQUEST_DEADLINE for other routes; a caller may ask for less with an
+    X-Request-Timeout header (seconds). Degradations go out as X-Degraded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = _route_deadlines()
+
+    def _seconds(self, scope) -> Optional[float]:
+        seconds = self.routes.get(scope["path"], settings.request_deadline) or None
+        for name, value in scope["headers"]:
+            if name == b"x-request-timeout":
+                try:
+                    asked = float(value)
+                except ValueError:
+                    break
+                if asked > 0:
+                    seconds = min(seconds, asked) if seconds else asked
+                break
+        return seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and d is not None and d.degraded:
+                message["headers"] = list(message.get("headers", [])) + [(b"x-degraded", ",".join(d.degraded).encode())]
+            await send(message)
+
+        with deadline(self._seconds(scope)) as d:
+            await self.app(scope, receive, send_wrapper)
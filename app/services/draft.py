@@ -1,12 +1,29 @@
 # app/services/draft.py
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
 import json
-from openai import OpenAI
 from openai import RateLimitError, APIStatusError
 from app.config import settings
 from app.models.schemas import Topic, DraftVariant
+from app.services.clients import openai_client, async_openai_client
+from app.services.cache import TieredCache, make_key
+from app.services.coalesce import SingleFlight
+from app.services import deadline
+from app.services.profiling import traced
+from app.services.scheduler import estimate_tokens, openai_scheduler
+from app.services.hedge import hedger
+from app.services.tokens import count_tokens
+from app.services.factcheck import normalize_claims, remember_claims
+from app.services.metrics import DRAFTS, LLM_FALLBACKS, OPENAI_LATENCY, PROMPT_TRIMS, record_usage, upstream_call
 
-client = OpenAI(api_key=settings.openai_api_key)
+# Opt-in (DRAFT_CACHE_TTL > 0): identical prompt + model -> reuse the completion.
+draft_cache = TieredCache(
+    "drafts",
+    settings.cache_db_path,
+    ttl=settings.draft_cache_ttl,
+    max_memory=settings.draft_cache_memory_items,
+    max_disk=settings.draft_cache_disk_items,
+)
 
 STYLE_GUIDE = """Tone: crisp, helpful, optimistic. Avoid hype.
 Structure: HOOK on first line, short paragraphs (<=2 sentences), 1 CTA line.
@@ -27,80 +44,181 @@ LENGTH_RULES = {
     "long": "220–350 words"
 }
 
-def _call_llm(prompt: str, model: str):
+@traced()
+def _call_llm(prompt: str, model: str, platform: str = ""):
     # Some models only support default temperature; omit it.
-    return client.chat.completions.create(
+    def call():
+        with upstream_call("openai", OPENAI_LATENCY, model=model, op="generate", platform=platform):
+            return openai_client().chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                timeout=deadline.timeout(settings.http_timeout),
+            )
+    resp = openai_scheduler.run_sync(model, call, estimate_tokens(prompt))
+    record_usage(model, resp.usage)
+    return resp
+
+@traced()
+async def _acall_llm(prompt: str, model: str, platform: str = ""):
+    # Async twin of _call_llm for the FastAPI routes; doesn't block the event loop.
+    async def call():
+        with upstream_call("openai", OPENAI_LATENCY, model=model, op="generate", platform=platform):
+            return await async_openai_client().chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                timeout=deadline.timeout(settings.http_timeout),
+            )
+    resp = await deadline.bounded(openai_scheduler.run(model, call, estimate_tokens(prompt)), "openai")
+    record_usage(model, resp.usage)
+    return resp
+
+async def _astream_llm(prompt: str, model: str):
+    return await async_openai_client().chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
         response_format={"type": "json_object"},
+        stream=True,
+        stream_options={"include_usage": True},  # final chunk carries token usage
     )
 
-def _build_prompt(
-    topic: Topic,
-    platform: str,
-    n: int,
-    mode: str,
-    background: Optional[str],
-    length: str,
-    research_sources: Optional[List[dict]],
-) -> str:
-    # Build "research pack" block (optional)
-    research_block = ""
-    if research_sources:
-        refs = []
-        for i, s in enumerate(research_sources[:5], start=1):
-            title = s.get("title", "")
-            url = s.get("url", "")
-            refs.append(f"[{i}] {title} — {url}")
-        if refs:
-            research_block = "RESEARCH PACK:\n" + "\n".join(refs)
-
-    if mode == "personal":
-        body_rules = f"""
-Write {n} {platform} posts in first person using the C-C-A-R-L frame:
+# Prompts are a static prefix (byte-identical for every request of a mode, so
+# the provider can cache it) followed by the per-request suffix. Anything that
+# varies - platform, n, length, topic, background, research - goes in the suffix.
+_BODY_RULES = {
+    "personal": f"""
+Write N posts for PLATFORM in first person using the C-C-A-R-L frame:
 - Context → Challenge → Action → Result (with a number if possible) → Lesson.
-Use the user BACKGROUND below as raw material.
-Length: {LENGTH_RULES.get(length,'140–220 words')}.
+Use the user BACKGROUND in the request as raw material.
+Length: the word range given as LENGTH.
 End with 1 CTA from: {CTA_BANK}.
 Avoid hyperbole; keep it grounded.
-BACKGROUND:
-{background or 'N/A'}
-"""
-    else:
-        # Topical / Insight — facts required, but NO inline [1] markers
-        body_rules = f"""
-Write {n} {platform} posts that deliver practical insight on the topic.
+""",
+    # Topical / Insight — facts required, but NO inline [1] markers
+    "topical": f"""
+Write N posts for PLATFORM that deliver practical insight on the TOPIC.
 Include 2–3 concrete, verifiable facts (numbers/dates/names). Use the RESEARCH PACK for grounding if provided.
 Do NOT include bracketed citation markers like [1] or [2].
 After the post body, add a single line that starts with "Sources:" followed by up to 3 concise domains (e.g., nasa.gov; jpl.nasa.gov; space.com). No extra commentary.
-Length: {LENGTH_RULES.get(length,'140–220 words')}.
+Length: the word range given as LENGTH.
 End with 1 CTA from: {CTA_BANK}.
 Avoid hashtags for now.
+""",
+}
+
+_JSON_SHAPE = """JSON shape:
+{
+  "items": [
+    {"variant": 1, "text": "TEXT", "rationale": "WHY THIS WORKS"},
+    ...
+  ]
+}
+"""
+
+_JSON_SHAPE_WITH_CLAIMS = """JSON shape:
+{
+  "items": [
+    {"variant": 1, "text": "TEXT", "rationale": "WHY THIS WORKS", "claims": ["CLAIM", ...]},
+    ...
+  ]
+}
+"claims" lists every concrete, checkable fact stated in that variant's TEXT (dates, numbers,
+named facts), each as a short standalone sentence (<= 15 words). Use [] if there are none.
 """
 
-    prompt = f"""
-Return ONLY valid JSON with key "items" -> list of variants.
+PROMPT_PREFIXES = {
+    mode: f"""Return ONLY valid JSON with key "items" -> list of variants.
 
-You are an expert {platform} content writer.
+You are an expert social media content writer for the PLATFORM named in the request.
 Follow this STYLE_GUIDE:
-{STYLE_GUIDE}
+{STYLE_GUIDE}{rules}
+{_JSON_SHAPE_WITH_CLAIMS if settings.draft_claims else _JSON_SHAPE}
+REQUEST:
+"""
+    for mode, rules in _BODY_RULES.items()
+}
 
+def _research_block(research_sources: List[dict]) -> List[str]:
+    refs = []
+    for i, s in enumerate(research_sources[:5], start=1):
+        title = s.get("title", "")
+        url = s.get("url", "")
+        refs.append(f"[{i}] {title} — {url}")
+    return refs
+
+@traced()
+def _build_prompt(
+    topic: Topic,
+    platform: str,
+    n: int,
+    mode: str,
+    background: Optional[str],
+    length: str,
+    research_sources: Optional[List[dict]],
+) -> str:
+    prefix = PROMPT_PREFIXES["personal" if mode == "personal" else "topical"]
+    request = f"""PLATFORM: {platform}
+N: {n}
+LENGTH: {LENGTH_RULES.get(length, '140–220 words')}
 TOPIC: "{topic.title}"
 ANGLE (optional): "{topic.angle or ''}"
+"""
+    if mode == "personal":
+        request += f"BACKGROUND:\n{background or 'N/A'}\n"
 
-{body_rules}
+    # Build "research pack" block (optional), dropping the lowest-ranked refs
+    # until the prompt fits PROMPT_TOKEN_BUDGET
+    refs = _research_block(research_sources or [])
+    while True:
+        research = ("\nRESEARCH PACK:\n" + "\n".join(refs) + "\n") if refs else ""
+        prompt = prefix + request + research
+        if not refs or count_tokens(prompt) <= settings.prompt_token_budget:
+            return prompt
+        refs.pop()
+        PROMPT_TRIMS.inc(mode=mode)
 
-{research_block}
+def _models_to_try() -> List[str]:
+    models = [settings.openai_model]
+    fb = getattr(settings, "openai_fallback_model", None)
+    if fb and fb not in models:
+        models.append(fb)
+    return models
 
-JSON shape:
-{{
-  "items": [
-    {{"variant": 1, "text": "TEXT", "rationale": "WHY THIS WORKS"}},
-    ...
-  ]
-}}
-"""
-    return prompt
+def _variant(item: dict, i: int) -> DraftVariant:
+    claims = item.get("claims")
+    return DraftVariant(
+        variant=item.get("variant", i),
+        text=(item.get("text") or "").strip(),
+        rationale=item.get("rationale"),
+        claims=normalize_claims(claims) if isinstance(claims, list) else None,
+    )
+
+def _parse_variants(content: str, n: int) -> List[DraftVariant]:
+    data = json.loads(content)
+    items = data.get("items", [])
+    return [_variant(item, i) for i, item in enumerate(items[:n], start=1)]
+
+def _draft_key(prompt: str, models: List[str]) -> str:
+    # keyed on the model chain so a config change (primary or fallback) misses
+    return make_key(models, prompt)
+
+# Identical generations already in flight (double submit, same topic from two
+# tabs) are joined rather than sent again; fresh=True only joins other fresh calls.
+draft_flight = SingleFlight("generate_variants")
+
+def _flight_key(prompt: str, models: List[str], n: int, fresh: bool) -> str:
+    return make_key(_draft_key(prompt, models), n, fresh)
+
+def _cached_variants(prompt: str, models: List[str]) -> Optional[List[DraftVariant]]:
+    hit = draft_cache.get(_draft_key(prompt, models))
+    return [DraftVariant(**v) for v in hit] if hit else None
+
+def _store_variants(prompt: str, models: List[str], variants: List[DraftVariant]) -> None:
+    draft_cache.set(_draft_key(prompt, models), [v.model_dump() for v in variants])
+    for v in variants:
+        if v.claims is not None:
+            remember_claims(v.text, v.claims)
 
 def generate_variants(
     topic: Topic,
@@ -110,29 +228,87 @@ def generate_variants(
     background: Optional[str] = None,
     length: str = "medium",
     research_sources: Optional[List[dict]] = None,
+    fresh: bool = False,
 ) -> List[DraftVariant]:
     prompt = _build_prompt(topic, platform, n, mode, background, length, research_sources)
+    models_to_try = _models_to_try()
+    if not fresh:
+        cached = _cached_variants(prompt, models_to_try)
+        if cached:
+            return cached
+    return draft_flight.do_sync(
+        _flight_key(prompt, models_to_try, n, fresh),
+        lambda: _generate(prompt, models_to_try, platform, n, mode),
+    )
 
-    models_to_try = [settings.openai_model]
-    fb = getattr(settings, "openai_fallback_model", None)
-    if fb and fb not in models_to_try:
-        models_to_try.append(fb)
+def _generate(prompt: str, models_to_try: List[str], platform: str, n: int, mode: str) -> List[DraftVariant]:
+    last_err = None
+    for m in models_to_try:
+        if m != models_to_try[0]:
+            if not deadline.has_time(settings.deadline_fallback_min):
+                deadline.degrade("no_fallback")
+                break
+            LLM_FALLBACKS.inc(model=m, platform=platform)
+        try:
+            resp = _call_llm(prompt, m, platform)
+            variants = _parse_variants(resp.choices[0].message.content, n)
+            if variants:
+                DRAFTS.inc(platform=platform, mode=mode)
+                _store_variants(prompt, models_to_try, variants)
+                return variants
+        except (RateLimitError, APIStatusError) as e:
+            last_err = e
+            continue
+        except Exception as e:
+            last_err = e
+            continue
+
+    raise RuntimeError(
+        f"Draft generation failed (models tried: {models_to_try}). Last error: {last_err}"
+    )
+
+async def generate_variants_async(
+    topic: Topic,
+    platform: str,
+    n: int = 3,
+    mode: str = "topical",
+    background: Optional[str] = None,
+    length: str = "medium",
+    research_sources: Optional[List[dict]] = None,
+    fresh: bool = False,
+) -> List[DraftVariant]:
+    """
+    Same contract as generate_variants, but awaits AsyncOpenAI so a worker
+    can keep many generations in flight at once.
+    """
+    prompt = _build_prompt(topic, platform, n, mode, background, length, research_sources)
+    models_to_try = _models_to_try()
+    if not fresh:
+        cached = _cached_variants(prompt, models_to_try)
+        if cached:
+            return cached
+    return await deadline.bounded(draft_flight.do(
+        _flight_key(prompt, models_to_try, n, fresh),
+        lambda: _agenerate(prompt, models_to_try, platform, n, mode),
+    ), "draft")
+
+async def _agenerate(prompt: str, models_to_try: List[str], platform: str, n: int, mode: str) -> List[DraftVariant]:
+    if settings.draft_hedge and len(models_to_try) > 1 and deadline.has_time(settings.deadline_fallback_min):
+        return await _hedged_variants(prompt, models_to_try, platform, n, mode)
 
     last_err = None
     for m in models_to_try:
+        if m != models_to_try[0]:
+            if not deadline.has_time(settings.deadline_fallback_min):
+                deadline.degrade("no_fallback")
+                break
+            LLM_FALLBACKS.inc(model=m, platform=platform)
         try:
-            resp = _call_llm(prompt, m)
-            content = resp.choices[0].message.content
-            data = json.loads(content)
-            items = data.get("items", [])
-            variants: List[DraftVariant] = []
-            for i, item in enumerate(items[:n], start=1):
-                variants.append(DraftVariant(
-                    variant=item.get("variant", i),
-                    text=(item.get("text") or "").strip(),
-                    rationale=item.get("rationale")
-                ))
+            resp = await _acall_llm(prompt, m, platform)
+            variants = _parse_variants(resp.choices[0].message.content, n)
             if variants:
+                DRAFTS.inc(platform=platform, mode=mode)
+                _store_variants(prompt, models_to_try, variants)
                 return variants
         except (RateLimitError, APIStatusError) as e:
             last_err = e
@@ -144,3 +320,246 @@ def generate_variants(
     raise RuntimeError(
         f"Draft generation failed (models tried: {models_to_try}). Last error: {last_err}"
     )
+
+async def _hedged_variants(prompt: str, models: List[str], platform: str, n: int, mode: str) -> List[DraftVariant]:
+    def attempt(model: str):
+        async def call() -> List[DraftVariant]:
+            resp = await _acall_llm(prompt, model, platform)
+            variants = _parse_variants(resp.choices[0].message.content, n)
+            if not variants:
+                raise ValueError(f"{model} returned no variants")
+            return variants
+        return model, call
+
+    try:
+        variants, model = await hedger.run(attempt(models[0]), attempt(models[1]), platform=platform)
+    except Exception as e:
+        raise RuntimeError(f"Draft generation failed (models tried: {models}). Last error: {e}")
+    if model != models[0]:
+        LLM_FALLBACKS.inc(model=model, platform=platform)
+    DRAFTS.inc(platform=platform, mode=mode)
+    _store_variants(prompt, models, variants)
+    return variants
+
+# ---------------------------
+# Streaming
+# ---------------------------
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"'}
+
+class _ItemsStreamParser:
+    """
+    Incremental scanner for the {"items": [{...}, ...]} payload. feed() takes raw
+    model output chunks and returns events as soon as they can be known:
+      ("delta", index, text)  - new characters of item[index]["text"]
+      ("item", index, dict)   - item[index] closed, parsed whole
+    index is 1-based position in "items". The scanner only tracks structure and
+    the text field; each item's raw span is kept and handed to json.loads when
+    it closes, so fields of any shape (objects, lists of objects) come through.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []             # open containers: "{" / "["
+        self._keys: List[Optional[str]] = []    # current key per open container
+        self._expect_key = False
+        self._in_str = False
+        self._is_key = False
+        self._esc = False
+        self._uni: Optional[str] = None         # pending \uXXXX digits
+        self._high: Optional[int] = None        # pending high surrogate
+        self._buf: List[str] = []
+        self._items_depth: Optional[int] = None
+        self._raw: Optional[List[str]] = None   # chunks of the open item's source
+        self._index = 0
+        self._streaming = False
+
+    def _at_item(self) -> bool:
+        return self._items_depth is not None and len(self._stack) == self._items_depth + 1
+
+    def _char(self, ch: str, delta: List[str]) -> None:
+        if self._high is not None:
+            code = ord(ch)
+            if 0xDC00 <= code <= 0xDFFF:
+                ch = chr(0x10000 + ((self._high - 0xD800) << 10) + (code - 0xDC00))
+            else:
+                self._buf.append("\ufffd")
+            self._high = None
+        self._buf.append(ch)
+        if self._streaming:
+            delta.append(ch)
+
+    def _flush_delta(self, delta: List[str], events: List[tuple]) -> None:
+        if delta:
+            events.append(("delta", self._index, "".join(delta)))
+            delta.clear()
+
+    def feed(self, chunk: str) -> List[tuple]:
+        events: List[tuple] = []
+        delta: List[str] = []
+        start = 0  # where the open item's source starts in this chunk
+        for pos, ch in enumerate(chunk):
+            if self._in_str:
+                if self._uni is not None:
+                    self._uni += ch
+                    if len(self._uni) == 4:
+                        code = int(self._uni, 16)
+                        self._uni = None
+                        if 0xD800 <= code <= 0xDBFF:
+                            self._high = code
+                        else:
+                            self._char(chr(code), delta)
+                elif self._esc:
+                    self._esc = False
+                    if ch == "u":
+                        self._uni = ""
+                    else:
+                        self._char(_ESCAPES.get(ch, ch), delta)
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    self._flush_delta(delta, events)
+                    if self._is_key:
+                        self._keys[-1] = "".join(self._buf)
+                        self._expect_key = False
+                    self._streaming = False
+                else:
+                    self._char(ch, delta)
+                continue
+
+            if ch == '"':
+                self._in_str = True
+                self._buf = []
+                self._is_key = bool(self._stack) and self._stack[-1] == "{" and self._expect_key
+                self._streaming = (not self._is_key) and self._raw is not None \
+                    and self._at_item() and self._keys[-1] == "text"
+            elif ch == "{":
+                self._stack.append("{")
+                self._keys.append(None)
+                self._expect_key = True
+                if self._at_item():
+                    self._index += 1
+                    self._raw, start = [], pos
+            elif ch == "[":
+                parent_key = self._keys[-1] if self._keys else None
+                self._stack.append("[")
+                self._keys.append(None)
+                if self._items_depth is None and len(self._stack) == 2 and parent_key == "items":
+                    self._items_depth = 2
+            elif ch in "}]":
+                if ch == "}" and self._raw is not None and self._at_item():
+                    self._raw.append(chunk[start:pos + 1])
+                    try:
+                        item = json.loads("".join(self._raw))
+                    except ValueError:
+                        item = {}
+                    self._raw = None
+                    events.append(("item", self._index, item))
+                if self._stack:
+                    self._stack.pop()
+                    self._keys.pop()
+                if self._items_depth is not None and len(self._stack) < self._items_depth:
+                    self._items_depth = None
+            elif ch == ",":
+                if self._stack and self._stack[-1] == "{":
+                    self._expect_key = True
+            elif ch == ":":
+                self._expect_key = False
+        if self._raw is not None:
+            self._raw.append(chunk[start:])
+        self._flush_delta(delta, events)
+        return events
+
+_STREAM_END = object()
+
+async def _pump_stream(prompt: str, model: str, n: int, platform: str, out: asyncio.Queue) -> None:
+    """
+    Read one upstream stream into `out` as parser events. The scheduler slot
+    is held only while the upstream streams, not while a slow client reads.
+    """
+    async with openai_scheduler.slot(model, estimate_tokens(prompt)):
+        with upstream_call("openai", OPENAI_LATENCY, model=model, op="stream", platform=platform):
+            stream = await _astream_llm(prompt, model)
+            parser = _ItemsStreamParser()
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    record_usage(model, chunk.usage)
+                if not chunk.choices:
+                    continue
+                for event in parser.feed(chunk.choices[0].delta.content or ""):
+                    if event[1] <= n:
+                        out.put_nowait(event)
+
+async def stream_variants(
+    topic: Topic,
+    platform: str,
+    n: int = 3,
+    mode: str = "topical",
+    background: Optional[str] = None,
+    length: str = "medium",
+    research_sources: Optional[List[dict]] = None,
+    fresh: bool = False,
+) -> AsyncIterator[Dict]:
+    """
+    Streaming generate_variants. Yields
+      {"type": "delta", "index": i, "text": "..."}       while variant i is written
+      {"type": "variant", "index": i, "variant": DraftVariant} once it is complete
+    The fallback model is only tried if the primary failed before producing output.
+    A draft-cache hit yields the stored variants straight away.
+    """
+    prompt = _build_prompt(topic, platform, n, mode, background, length, research_sources)
+    models_to_try = _models_to_try()
+    if not fresh:
+        cached = _cached_variants(prompt, models_to_try)
+        if cached:
+            for i, v in enumerate(cached, start=1):
+                yield {"type": "variant", "index": i, "variant": v}
+            return
+
+    last_err = None
+    for m in models_to_try:
+        if m != models_to_try[0]:
+            if not deadline.has_time(settings.deadline_fallback_min):
+                deadline.degrade("no_fallback")
+                break
+            LLM_FALLBACKS.inc(model=m, platform=platform)
+        # a 429 before anything streamed retries this model: slot() waits out its Retry-After
+        for _ in range(settings.openai_max_retries + 1):
+            produced = 0
+            variants: List[DraftVariant] = []
+            events: asyncio.Queue = asyncio.Queue()
+            pump = asyncio.create_task(_pump_stream(prompt, m, n, platform, events))
+            pump.add_done_callback(lambda _, q=events: q.put_nowait(_STREAM_END))
+            try:
+                try:
+                    while (event := await events.get()) is not _STREAM_END:
+                        kind, idx, payload = event
+                        produced += 1
+                        if kind == "delta":
+                            yield {"type": "delta", "index": idx, "text": payload}
+                        else:
+                            v = _variant(payload, idx)
+                            variants.append(v)
+                            yield {"type": "variant", "index": idx, "variant": v}
+                    pump.result()  # the upstream error, if any
+                finally:
+                    pump.cancel()  # the client went away: stop reading upstream
+                if variants:
+                    DRAFTS.inc(platform=platform, mode=mode)
+                    _store_variants(prompt, models_to_try, variants)
+                if produced:
+                    return
+                break
+            except RateLimitError as e:
+                if produced:
+                    raise
+                last_err = e
+                continue
+            except Exception as e:
+                if produced:
+                    raise
+                last_err = e
+                break
+
+    raise RuntimeError(
+        f"Draft generation failed (models tried: {models_to_try}). Last error: {last_err}"
+    )
@@ -0,0 +1,271 @@
+# app/services/evidence.py
+"""
+Local full-text index of every search result we have fetched, so fact-checks
+can verify claims offline before going to SerpApi.
+
+    python -m app.services.evidence load dump.jsonl     # pre-load (title, snippet, url, fetched_at per line)
+    python -m app.services.evidence dump out.jsonl      # export, e.g. to seed another box
+    python -m app.services.evidence maintain --vacuum   # expire, compact, reclaim space
+"""
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.config import settings
+from app.services.metrics import LOCAL_EVIDENCE
+from app.services.scoring import claim_terms
+from app.services.store import LocalDB
+
+# External-content FTS5 table over `evidence`; the triggers keep it in sync,
+# including the upsert's UPDATE when a url is fetched again.
+EVIDENCE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evidence (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    snippet TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evidence_fetched ON evidence (fetched_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS evidence_fts USING fts5(
+    title, snippet, content='evidence', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS evidence_ai AFTER INSERT ON evidence BEGIN
+    INSERT INTO evidence_fts (rowid, title, snippet) VALUES (new.id, new.title, new.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS evidence_ad AFTER DELETE ON evidence BEGIN
+    INSERT INTO evidence_fts (evidence_fts, rowid, title, snippet) VALUES ('delete', old.id, old.title, old.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS evidence_au AFTER UPDATE ON evidence BEGIN
+    INSERT INTO evidence_fts (evidence_fts, rowid, title, snippet) VALUES ('delete', old.id, old.title, old.snippet);
+    INSERT INTO evidence_fts (rowid, title, snippet) VALUES (new.id, new.title, new.snippet);
+END;
+"""
+
+MAINTAIN_POLL = 30.0  # how often the app's maintenance task looks for due work
+
+def _fts_query(claim: str) -> str:
+    # any claim term; bm25 ranks documents that share more (and rarer) terms first
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in claim_terms(claim))
+
+def _timestamp(value: Any, default: float) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return float(value)
+        except ValueError:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    return default
+
+class EvidenceStore:
+    """
+    Search results (title, snippet, url, fetch time) in SQLite FTS5, shared by
+    all workers on the box. Rows older than EVIDENCE_MAX_AGE don't count as
+    evidence; rows older than EVIDENCE_TTL are deleted by maintain(), which
+    the app's background task (start()) runs off the request path once
+    EVIDENCE_MAINTAIN_EVERY rows have been added. Best-effort like the
+    cache's disk tier: SQLite errors (or an SQLite without FTS5) disable it.
+    """
+
+    def __init__(self, path: str):
+        self._db = LocalDB(path, EVIDENCE_SCHEMA)
+        self._lock = threading.Lock()
+        self._added = 0
+        self._due = False
+        self._task: Optional[asyncio.Task] = None
+        self.enabled = settings.evidence_index
+        self.error: Optional[str] = None
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not self.enabled:
+            return None
+        try:
+            return self._db.conn()
+        except sqlite3.Error as e:
+            self.enabled, self.error = False, str(e)  # e.g. "no such module: fts5"
+            return None
+
+    def add(self, results: Iterable[Dict], fetched_at: Optional[float] = None) -> int:
+        """
+        Upsert results by url (rows without one are skipped); returns rows written.
+        """
+        now = time.time()
+        rows = [
+            (r["url"], r.get("title") or "", r.get("snippet") or "", _timestamp(r.get("fetched_at"), fetched_at or now))
+            for r in results if r.get("url")
+        ]
+        conn = self._conn()
+        if conn is None or not rows:
+            return 0
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO evidence (url, title, snippet, fetched_at) VALUES (?,?,?,?)"
+                " ON CONFLICT(url) DO UPDATE SET title=excluded.title, snippet=excluded.snippet,"
+                " fetched_at=max(fetched_at, excluded.fetched_at)",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return 0
+        with self._lock:
+            self._added += len(rows)
+            if self._added >= settings.evidence_maintain_every:
+                self._added = 0
+                self._due = True  # picked up by the maintenance task, not run here on the request path
+        return len(rows)
+
+    def search(self, claim: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Best-matching fresh rows for `claim`, shaped like search results.
+        """
+        query = _fts_query(claim)
+        conn = self._conn()
+        if conn is None or not query:
+            return []
+        try:
+            rows = conn.execute(
+                "SELECT e.title, e.url, e.snippet, e.fetched_at FROM evidence_fts"
+                " JOIN evidence e ON e.id = evidence_fts.rowid"
+                " WHERE evidence_fts MATCH ? AND e.fetched_at >= ?"
+                " ORDER BY evidence_fts.rank LIMIT ?",
+                (query, time.time() - settings.evidence_max_age, limit or settings.evidence_candidates),
+            ).fetchall()
+        except sqlite3.Error:
+            return []
+        return [{"title": t, "url": u, "snippet": s, "source": "local", "fetched_at": f} for t, u, s, f in rows]
+
+    def maintain(self, vacuum: bool = False) -> Dict:
+        """
+        Delete expired rows and the oldest beyond EVIDENCE_MAX_ROWS, then merge
+        the FTS segments; `vacuum` also gives the freed pages back to the disk.
+        """
+        conn = self._conn()
+        if conn is None:
+            return {"expired": 0, "trimmed": 0}
+        expired = conn.execute("DELETE FROM evidence WHERE fetched_at < ?",
+                               (time.time() - settings.evidence_ttl,)).rowcount
+        trimmed = conn.execute(
+            "DELETE FROM evidence WHERE id IN (SELECT id FROM evidence ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+            (settings.evidence_max_rows,),
+        ).rowcount
+        conn.execute("INSERT INTO evidence_fts (evidence_fts) VALUES ('optimize')")
+        if vacuum:
+            conn.execute("VACUUM")
+        return {"expired": expired, "trimmed": trimmed}
+
+    async def _maintain_loop(self) -> None:
+        while True:
+            await asyncio.sleep(MAINTAIN_POLL)
+            if not self._due:
+                continue
+            self._due = False
+            try:
+                await asyncio.to_thread(self.maintain)
+            except sqlite3.Error:
+                pass  # busy with another worker's maintenance; the next round catches up
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._maintain_loop())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def load_jsonl(self, path: str, batch: int = 1000) -> Tuple[int, int]:
+        """
+        Pre-load from a JSONL dump: one {"title", "snippet", "url"/"link", "fetched_at"} per line.
+        Returns (rows written, lines skipped); lines that aren't JSON objects or
+        lack a url or a readable fetched_at are skipped rather than aborting the load.
+        """
+        total, skipped, pending = 0, 0, []
+        now = time.time()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    r = json.loads(line)
+                    r.setdefault("url", r.get("link"))
+                    r["fetched_at"] = _timestamp(r.get("fetched_at"), now)
+                except (ValueError, TypeError, AttributeError):
+                    skipped += 1
+                    continue
+                if not r["url"]:
+                    skipped += 1
+                    continue
+                pending.append(r)
+                if len(pending) >= batch:
+                    total += self.add(pending)
+                    pending = []
+        return total + self.add(pending), skipped
+
+    def dump_jsonl(self, path: str) -> int:
+        conn = self._conn()
+        if conn is None:
+            return 0
+        n = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for title, url, snippet, fetched_at in conn.execute(
+                "SELECT title, url, snippet, fetched_at FROM evidence ORDER BY fetched_at"
+            ):
+                f.write(json.dumps({"title": title, "url": url, "snippet": snippet, "fetched_at": fetched_at},
+                                   ensure_ascii=False) + "\n")
+                n += 1
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = LOCAL_EVIDENCE.value(result="hit"), LOCAL_EVIDENCE.value(result="miss")
+        out: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+        conn = self._conn()
+        if conn is None:
+            out["error"] = self.error
+            return out
+        rows, fresh = conn.execute(
+            "SELECT count(*), count(*) FILTER (WHERE fetched_at >= ?) FROM evidence",
+            (time.time() - settings.evidence_max_age,),
+        ).fetchone()
+        out.update(rows=rows, fresh_rows=fresh)
+        return out
+
+local_evidence = EvidenceStore(settings.evidence_db_path)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Local evidence index maintenance.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("load", help="add the rows of a JSONL dump").add_argument("path")
+    sub.add_parser("dump", help="write every row to a JSONL file").add_argument("path")
+    sub.add_parser("maintain", help="expire and compact").add_argument("--vacuum", action="store_true")
+    sub.add_parser("stats")
+    args = ap.parse_args(argv)
+    if local_evidence._conn() is None:
+        print("evidence index disabled" + (f": {local_evidence.error}" if local_evidence.error else ""))
+        return 1
+    if args.cmd == "load":
+        loaded, skipped = local_evidence.load_jsonl(args.path)
+        print(f"loaded {loaded} rows" + (f", skipped {skipped} malformed lines" if skipped else ""))
+    elif args.cmd == "dump":
+        print(f"wrote {local_evidence.dump_jsonl(args.path)} rows")
+    elif args.cmd == "maintain":
+        print(local_evidence.maintain(vacuum=args.vacuum))
+    else:
+        print(json.dumps(local_evidence.stats(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
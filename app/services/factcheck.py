@@ -1,52 +1,63 @@
 # app/services/factcheck.py
-import requests
-from typing import List, Dict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Set, Tuple
 import json
+import re
 from app.config import settings
-from openai import OpenAI
+from app.services.cache import TieredCache, make_key, normalize_query
+from app.services.coalesce import SingleFlight
+from app.services import deadline
+from app.services.profiling import traced
+from app.services.clients import openai_client, async_openai_client, http_client, async_http_client
+from app.services.scoring import EvidenceIndex
+from app.services.evidence import local_evidence
+from app.services.scheduler import estimate_tokens, openai_scheduler
+from app.services.metrics import CLAIM_SOURCES, LOCAL_EVIDENCE, OPENAI_LATENCY, SERPAPI_LATENCY, record_usage, upstream_call
 
-_oai = OpenAI(api_key=settings.openai_api_key)
+search_cache = TieredCache(
+    "serpapi",
+    settings.cache_db_path,
+    ttl=settings.search_cache_ttl,
+    max_memory=settings.search_cache_memory_items,
+    max_disk=settings.search_cache_disk_items,
+)
 
-def extract_claims(text: str, max_claims: int = 8) -> List[str]:
-    """
-    Use the LLM to pull out short factual claims that should be verified.
-    Returns a list of strings.
-    """
-    prompt = f"""
-You extract short factual claims (<= 15 words) that must be true in the real world.
+# static prefix first so it is cached across calls; the per-call part follows
+CLAIMS_PREFIX = """You extract short factual claims (<= 15 words) that must be true in the real world.
 - Claims should be atomic and concrete (dates, numbers, named facts, achievements).
 - Ignore opinions, advice, and generic statements.
 - Ignore any line beginning with "Sources:".
 - Return a JSON OBJECT with this exact shape:
-{{
+{
   "items": ["claim 1", "claim 2", ...]
-}}
-If there are no factual claims, return {{"items":[]}}.
-Extract up to {max_claims} claims.
+}
+If there are no factual claims, return {"items":[]}.
+Extract at most MAX_CLAIMS claims from the TEXT.
+
+"""
+
+def _claims_prompt(text: str, max_claims: int) -> str:
+    return f"""{CLAIMS_PREFIX}MAX_CLAIMS: {max_claims}
 
 TEXT:
 \"\"\"{text}\"\"\"
 """
 
-    resp = _oai.chat.completions.create(
-        model=settings.openai_model,
-        messages=[{"role": "user", "content": prompt}],
-        # keep object format to guarantee an object, not a bare list
-        response_format={"type": "json_object"},
-    )
-
-    content = resp.choices[0].message.content
+def _parse_claims(content: str) -> List[str]:
     try:
         data = json.loads(content)
         items = data.get("items", [])
     except Exception:
         items = []
+    return normalize_claims(items)
 
+def normalize_claims(items: List) -> List[str]:
     # normalize: strip, dedupe, filter empties
     uniq: List[str] = []
     seen = set()
     for c in items:
-        c = (c or "").strip()
+        c = c.strip() if isinstance(c, str) else ""
         if not c:
             continue
         if c.lower().startswith("sources:"):
@@ -56,26 +67,108 @@ TEXT:
             uniq.append(c)
     return uniq
 
-def serpapi_search(query: str, num: int = None) -> List[Dict]:
+# ---------------------------
+# Claims listed by the drafting model
+# ---------------------------
+# Stored by draft body, so a draft that comes back unedited (finalize only adds
+# the Sources line and hashtags) is audited without an extraction call.
+claims_store = TieredCache(
+    "claims",
+    settings.cache_db_path,
+    ttl=settings.research_session_ttl,
+    max_memory=settings.search_cache_memory_items,
+    max_disk=settings.search_cache_disk_items,
+)
+
+_HASHTAG_LINE = re.compile(r"^(#\w+\s*)+$")
+_INLINE_REF = re.compile(r"\s*\[(?:\d{1,2}|[A-Za-z])\]")
+
+def _draft_body_key(text: str) -> str:
+    lines = [
+        l for l in (text or "").splitlines()
+        if not l.strip().lower().startswith("sources:") and not _HASHTAG_LINE.match(l.strip())
+    ]
+    body = _INLINE_REF.sub("", "\n".join(lines))
+    return make_key("draft-body", " ".join(body.split()))
+
+def remember_claims(text: str, claims: List[str]) -> None:
+    claims_store.set(_draft_body_key(text), claims)
+
+def known_claims(text: str) -> Optional[List[str]]:
     """
-    Minimal SerpApi Web Search call.
-    Docs: https://serpapi.com/search-api
+    Claims the drafting model listed for `text`, or None if the text was edited
+    (or never generated here) and needs extraction.
     """
-    if not settings.serpapi_key:
-        raise RuntimeError("Missing SERPAPI_KEY")
+    return claims_store.get(_draft_body_key(text))
+
+# identical concurrent requests (double clicks, a team on one topic) share one upstream call
+claims_flight = SingleFlight("extract_claims")
+search_flight = SingleFlight("serpapi_search")
+
+def _claims_key(text: str, max_claims: int) -> str:
+    return make_key(settings.openai_model, max_claims, " ".join(text.split()))
 
-    url = "https://serpapi.com/search.json"
+@traced()
+def extract_claims(text: str, max_claims: int = 8) -> List[str]:
+    """
+    Use the LLM to pull out short factual claims that should be verified.
+    Returns a list of strings.
+    """
+    prompt = _claims_prompt(text, max_claims)
+
+    def call():
+        with upstream_call("openai", OPENAI_LATENCY, model=settings.openai_model, op="claims"):
+            return openai_client().chat.completions.create(
+                model=settings.openai_model,
+                messages=[{"role": "user", "content": prompt}],
+                # keep object format to guarantee an object, not a bare list
+                response_format={"type": "json_object"},
+                timeout=deadline.timeout(settings.http_timeout),
+            )
+
+    def extract() -> List[str]:
+        resp = openai_scheduler.run_sync(settings.openai_model, call, estimate_tokens(prompt))
+        record_usage(settings.openai_model, resp.usage)
+        return _parse_claims(resp.choices[0].message.content)
+    return claims_flight.do_sync(_claims_key(text, max_claims), extract)
+
+@traced()
+async def extract_claims_async(text: str, max_claims: int = 8) -> List[str]:
+    """
+    Async twin of extract_claims (AsyncOpenAI, non-blocking).
+    """
+    prompt = _claims_prompt(text, max_claims)
+
+    async def call():
+        with upstream_call("openai", OPENAI_LATENCY, model=settings.openai_model, op="claims"):
+            return await async_openai_client().chat.completions.create(
+                model=settings.openai_model,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                timeout=deadline.timeout(settings.http_timeout),
+            )
+
+    async def extract() -> List[str]:
+        resp = await openai_scheduler.run(settings.openai_model, call, estimate_tokens(prompt))
+        record_usage(settings.openai_model, resp.usage)
+        return _parse_claims(resp.choices[0].message.content)
+    return await deadline.bounded(claims_flight.do(_claims_key(text, max_claims), extract), "claims")
+
+SERPAPI_URL = settings.serpapi_url
+
+def _serpapi_request(query: str, num: Optional[int]) -> Tuple[str, int, dict]:
+    n = num or settings.serpapi_num
+    key = make_key(normalize_query(query), settings.serpapi_engine, settings.serpapi_location, n)
     params = {
         "engine": settings.serpapi_engine,  # e.g., google, duckduckgo, yahoo
         "q": query,
         "api_key": settings.serpapi_key,
         "location": settings.serpapi_location,
-        "num": num or settings.serpapi_num,
+        "num": n,
     }
-    r = requests.get(url, params=params, timeout=20)
-    r.raise_for_status()
-    data = r.json()
+    return key, n, params
 
+def _parse_serpapi(data: dict, n: int) -> List[Dict]:
     results = []
     for item in (data.get("organic_results") or []):
         results.append({
@@ -86,43 +179,227 @@ def serpapi_search(query: str, num: int = None) -> List[Dict]:
         })
 
     if not results:
-        for item in data.get("results", [])[: (num or settings.serpapi_num)]:
+        for item in data.get("results", [])[:n]:
             results.append({
                 "title": item.get("title", ""),
                 "url": item.get("link") or item.get("url", ""),
                 "snippet": item.get("snippet", ""),
                 "source": "serpapi",
             })
-    return results[: (num or settings.serpapi_num)]
+    return results[:n]
 
+@traced()
+def serpapi_search(query: str, num: int = None) -> List[Dict]:
+    """
+    Minimal SerpApi Web Search call, cached on (normalized query, engine, location, num).
+    Docs: https://serpapi.com/search-api
+    """
+    key, n, params = _serpapi_request(query, num)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if not settings.serpapi_key:
+        raise RuntimeError("Missing SERPAPI_KEY")
+
+    def fetch() -> List[Dict]:
+        with upstream_call("serpapi", SERPAPI_LATENCY):
+            r = http_client().get(SERPAPI_URL, params=params, timeout=deadline.timeout(20))
+            r.raise_for_status()
+        results = _parse_serpapi(r.json(), n)
+        search_cache.set(key, results)
+        local_evidence.add(results)
+        return results
+    return search_flight.do_sync(key, fetch)
+
+@traced()
+async def serpapi_search_async(query: str, num: int = None) -> List[Dict]:
+    """
+    Async twin of serpapi_search on the shared keep-alive pool.
+    """
+    key, n, params = _serpapi_request(query, num)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if not settings.serpapi_key:
+        raise RuntimeError("Missing SERPAPI_KEY")
+
+    async def fetch() -> List[Dict]:
+        with upstream_call("serpapi", SERPAPI_LATENCY):
+            r = await async_http_client().get(SERPAPI_URL, params=params, timeout=deadline.timeout(20))
+            r.raise_for_status()
+        results = _parse_serpapi(r.json(), n)
+        search_cache.set(key, results)
+        local_evidence.add(results)
+        return results
+    return await deadline.bounded(search_flight.do(key, fetch), "serpapi")
+
+@traced()
 def score_confidence(claim: str, results: List[Dict]) -> float:
     """
-    Tiny heuristic: higher if multiple snippets overlap claim terms.
-    """
-    claim_terms = {w.lower().strip(".,:;!?()[]'\"") for w in claim.split() if len(w) > 3}
-    hits = 0
-    for r in results:
-        text = f"{r.get('title','')} {r.get('snippet','')}".lower()
-        overlap = sum(1 for t in claim_terms if t in text)
-        if overlap >= max(1, len(claim_terms)//4):
-            hits += 1
-    if hits >= 3: return 0.95
-    if hits == 2: return 0.85
-    if hits == 1: return 0.65
-    return 0.4
-
-def audit_text(text: str) -> List[Dict]:
-    """
-    Full audit: extract claims -> search -> confidence -> top sources
-    """
-    claims = extract_claims(text)
-    audits = []
-    for c in claims:
-        res = serpapi_search(c, num=5)
-        conf = score_confidence(c, res)
-        audits.append({
-            "claim": c,
-            "confidence": round(conf, 2),
-            "sources": res[:3],
-        })
+    BM25 support of `claim` in `results` (see services/scoring.py).
+    Audits use EvidenceIndex directly so all claims share one index.
+    """
+    return EvidenceIndex(results).assess(claim)["confidence"]
+
+def _claim_audit(index: EvidenceIndex, claim: str, doc_ids: Optional[List[int]] = None) -> Dict:
+    a = index.assess(claim, doc_ids)
+    return {
+        "claim": claim,
+        "confidence": round(a["confidence"], 2),
+        "sources": a["sources"],
+        "evidence": a["evidence"],
+    }
+
+def _failed_audit(claim: str, err: Exception) -> Dict:
+    return {"claim": claim, "confidence": 0.0, "sources": [], "error": str(err)}
+
+def _unchecked_audit(claim: str) -> Dict:
+    # scored as unsupported so publish gating still treats it as weak
+    return {"claim": claim, "confidence": 0.0, "sources": [], "unchecked": True}
+
+@traced("factcheck.score_confidence")
+def _final_audits(
+    index: EvidenceIndex, claims: List[str], failed: Dict[int, Exception], unchecked: Set[int] = frozenset()
+) -> List[Dict]:
+    # one batched pass over every (claim, result) pair once all searches are in
+    return [
+        _unchecked_audit(c) if i in unchecked else _failed_audit(c, failed[i]) if i in failed else _claim_audit(index, c)
+        for i, c in enumerate(claims)
+    ]
+
+@traced()
+def _local_audit(index: EvidenceIndex, claim: str) -> Optional[Dict]:
+    """
+    Audit of `claim` against the local evidence index alone, when that is
+    strong enough (EVIDENCE_MIN_CONFIDENCE) to skip the web search.
+    """
+    rows = local_evidence.search(claim)
+    if rows:
+        audit = _claim_audit(index, claim, index.add(rows))
+        if audit["confidence"] >= settings.evidence_min_confidence:
+            LOCAL_EVIDENCE.inc(result="hit")
+            return audit
+    LOCAL_EVIDENCE.inc(result="miss")
+    return None
+
+def _search_claim(claim: str):
+    try:
+        return serpapi_search(claim, num=5)
+    except Exception as e:
+        return e
+
+def audit_text(
+    text: str,
+    claims: Optional[List[str]] = None,
+    evidence: Optional[List[Dict]] = None,
+) -> List[Dict]:
+    """
+    Full audit: claims (the draft's own, else extracted) -> search -> confidence -> top sources.
+    Claims `evidence` or the local evidence index already supports skip the
+    search, as in audit_text_async; the rest are searched concurrently
+    (FACTCHECK_CONCURRENCY). All are then scored together against one evidence
+    index; results keep claim order.
+    """
+    if claims is None:
+        claims = known_claims(text)
+        CLAIM_SOURCES.inc(source="extracted" if claims is None else "draft")
+    if claims is None:
+        claims = extract_claims(text)
+    if not claims:
+        return []
+    index = EvidenceIndex()
+    evidence_ids = index.add(evidence) if evidence else []
+
+    def supported(c: str) -> bool:
+        if evidence_ids and _claim_audit(index, c, evidence_ids)["confidence"] >= settings.research_evidence_min_confidence:
+            return True
+        return _local_audit(index, c) is not None
+
+    todo = [i for i, c in enumerate(claims) if not supported(c)]
+    failed: Dict[int, Exception] = {}
+    if todo:
+        workers = max(1, min(settings.factcheck_concurrency, len(todo)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            searched = list(pool.map(_search_claim, [claims[i] for i in todo]))
+        for i, res in zip(todo, searched):
+            if isinstance(res, Exception):
+                failed[i] = res
+            else:
+                index.add(res)
+    return _final_audits(index, claims, failed)
+
+async def audit_text_async(
+    text: str,
+    claims: Optional[List[str]] = None,
+    evidence: Optional[List[Dict]] = None,
+    on_claims: Optional[Callable[[List[str]], None]] = None,
+    on_audit: Optional[Callable[[int, Dict], None]] = None,
+) -> List[Dict]:
+    """
+    Async audit for the web routes: at most FACTCHECK_CONCURRENCY searches in flight.
+    A failed search is reported on its own claim instead of failing the audit.
+    on_claims / on_audit let background jobs record progress as it happens:
+    on_audit fires with a provisional audit (claim vs. its own results) as each
+    search lands, then once more per claim with the final batched score.
+    `evidence` (e.g. the draft's research pack) is scored first; claims it
+    already supports at RESEARCH_EVIDENCE_MIN_CONFIDENCE skip SerpApi, and so
+    do claims the local evidence index supports (see _local_audit).
+    Without `claims`, an unedited draft reuses the claims it was generated with.
+    Under a request deadline, claims still searching when it is nearly up are
+    returned as "unchecked" (a partial audit) rather than overrunning it.
+    """
+    if claims is None:
+        claims = known_claims(text)
+        CLAIM_SOURCES.inc(source="extracted" if claims is None else "draft")
+    if claims is None:
+        claims = await extract_claims_async(text)
+    if on_claims:
+        on_claims(claims)
+    sem = asyncio.Semaphore(max(1, settings.factcheck_concurrency))
+    index = EvidenceIndex()
+    failed: Dict[int, Exception] = {}
+    evidence_ids = index.add(evidence) if evidence else []
+
+    checked: Set[int] = set()
+
+    async def check(i: int, c: str) -> None:
+        if evidence_ids:
+            pre = _claim_audit(index, c, evidence_ids)
+            if pre["confidence"] >= settings.research_evidence_min_confidence:
+                checked.add(i)
+                if on_audit:
+                    on_audit(i, pre)
+                return
+        local = _local_audit(index, c)
+        if local is not None:
+            checked.add(i)
+            if on_audit:
+                on_audit(i, local)
+            return
+        async with sem:
+            try:
+                res = await serpapi_search_async(c, num=5)
+            except Exception as e:
+                failed[i] = e
+                checked.add(i)
+                if on_audit:
+                    on_audit(i, _failed_audit(c, e))
+                return
+        doc_ids = index.add(res)
+        checked.add(i)
+        if on_audit:
+            on_audit(i, _claim_audit(index, c, doc_ids))
+
+    tasks = [asyncio.ensure_future(check(i, c)) for i, c in enumerate(claims)]
+    try:
+        await deadline.bounded(asyncio.gather(*tasks), "audit", reserve=settings.deadline_render_reserve)
+    except deadline.DeadlineExceeded:
+        deadline.degrade("partial_audit")
+    unchecked = set(range(len(claims))) - checked
+    audits = _final_audits(index, claims, failed, unchecked)
+    if on_audit:
+        for i, a in enumerate(audits):
+            on_audit(i, a)
     return audits
@@ -2,6 +2,7 @@
 import re
 from typing import Optional
 from app.models.schemas import FinalizeResponse
+from app.services.profiling import traced
 
 HASHTAGS = {
     "linkedin": ["#AI", "#EngineeringLeadership", "#Productivity", "#Learning"],
@@ -27,6 +28,7 @@ def _append_sources_line(text: str, platform: str, sources: Optional[str]) -> st
             return candidate
     return text
 
+@traced()
 def finalize_text(text: str, platform: str, sources: Optional[str] = None) -> FinalizeResponse:
     max_len = 280 if platform.lower() == "bluesky" else 2800
 
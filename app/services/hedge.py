@@ -0,0 +1,125 @@
+# app/services/hedge.py
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+from app.config import settings
+from app.services.metrics import LLM_HEDGE_WINS, LLM_HEDGES
+
+# Rolling-p95 needs this many samples; until then HEDGE_WARMUP_DELAY applies
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WARMUP_DELAY = 10.0
+
+class LatencyWindow:
+    """
+    Last HEDGE_WINDOW latencies per model, for a rolling p95: completed calls,
+    plus calls cancelled after losing a race at the time they had taken.
+    """
+
+    def __init__(self, size: int = HEDGE_WINDOW):
+        self.size = size
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.size)).append(seconds)
+
+    def p95(self, model: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+class Hedger:
+    """
+    Primary first; if it hasn't answered within the hedge delay, start the
+    fallback too and take whichever returns a valid result first. The loser is
+    cancelled. A primary that fails before the delay falls back right away,
+    as the non-hedged path does.
+    """
+
+    def __init__(self):
+        self.latency = LatencyWindow()
+        self.requests = 0
+        self.hedged = 0
+        self.wins = {"primary": 0, "fallback": 0}
+
+    def delay(self, model: str) -> float:
+        if settings.draft_hedge_delay > 0:
+            return settings.draft_hedge_delay
+        p95 = self.latency.p95(model)
+        return p95 if p95 is not None else HEDGE_WARMUP_DELAY
+
+    async def _timed(self, model: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # a primary that lost the race took at least this long; dropping it
+            # would pull the p95 toward the fast calls and hedge ever more often
+            self.latency.add(model, time.perf_counter() - start)
+            raise
+        self.latency.add(model, time.perf_counter() - start)
+        return result
+
+    async def run(
+        self,
+        primary: Tuple[str, Callable[[], Awaitable[Any]]],
+        fallback: Tuple[str, Callable[[], Awaitable[Any]]],
+        platform: str = "",
+    ) -> Tuple[Any, str]:
+        """
+        Returns (result, model that produced it). Each call must raise on an
+        unusable result so the other one can still win.
+        """
+        self.requests += 1
+        p_model, p_call = primary
+        f_model, f_call = fallback
+        p_task = asyncio.create_task(self._timed(p_model, p_call))
+        tasks = {p_task: "primary"}
+        try:
+            done, _ = await asyncio.wait({p_task}, timeout=self.delay(p_model))
+            if done and p_task.exception() is None:
+                return p_task.result(), p_model
+            hedging = not done
+            if hedging:
+                self.hedged += 1
+                LLM_HEDGES.inc(platform=platform)
+            # hedge (primary slow) or plain fallback (primary already failed)
+            f_task = asyncio.create_task(self._timed(f_model, f_call))
+            tasks[f_task] = "fallback"
+            pending = {t for t in tasks if not t.done()}
+            last_err: Optional[BaseException] = p_task.exception() if p_task.done() else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        role = tasks[t]
+                        if hedging:
+                            self.wins[role] += 1
+                            LLM_HEDGE_WINS.inc(winner=role, platform=platform)
+                        return t.result(), (p_model if role == "primary" else f_model)
+                    last_err = t.exception()
+            raise last_err
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    def stats(self) -> Dict:
+        decided = sum(self.wins.values())  # hedged races that produced a result
+        return {
+            "enabled": settings.draft_hedge,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "fallback_wins": self.wins["fallback"],
+            "fallback_win_rate": round(self.wins["fallback"] / decided, 4) if decided else 0.0,
+            "delay": round(self.delay(settings.openai_model), 3),
+        }
+
+hedger = Hedger()
@@ -0,0 +1,205 @@
+# app/services/jobs.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+from app.config import settings
+from app.services.factcheck import audit_text_async
+from app.services import deadline, profiling
+from app.services.research import load_research
+from app.services.store import LocalDB
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS factcheck_jobs (
+    id TEXT PRIMARY KEY,
+    text_hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    research_token TEXT,             -- research pack used as first-line evidence
+    status TEXT NOT NULL,            -- queued | running | done | failed
+    claims TEXT,                     -- JSON list once extracted
+    error TEXT,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS factcheck_jobs_hash ON factcheck_jobs (text_hash, created_at);
+CREATE TABLE IF NOT EXISTS factcheck_results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    audit TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+# a "running" job whose owner hasn't written anything for this long is assumed
+# orphaned (worker restarted) and may be picked up again
+STALE_AFTER = 120
+# how often a running job's owner touches it; well inside STALE_AFTER so a
+# single slow claim (one long OpenAI or SerpApi call) doesn't look orphaned
+HEARTBEAT = 30
+
+class FactcheckJobs:
+    """
+    Fact-checks that outlive the HTTP request. Jobs and per-claim results live in
+    SQLite so any worker can answer a status poll and a page reload just resumes
+    polling. At most FACTCHECK_JOB_WORKERS audits run at once in this process, so
+    fact-check load cannot crowd out draft generation.
+    """
+
+    def __init__(self, path: str, workers: int):
+        self._db = LocalDB(path, JOBS_SCHEMA)
+        self._workers = max(1, workers)
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._spawned: Set[str] = set()  # job ids with a task in this process
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._workers)
+        return self._sem
+
+    # ---------------------------
+    # Store
+    # ---------------------------
+    def submit(self, text: str, research_token: Optional[str] = None) -> str:
+        """
+        Queue an audit of `text`; returns the job id. Re-submitting the same text
+        while its job is pending (or finished within FACTCHECK_JOB_TTL) returns
+        the existing job instead of starting over.
+        """
+        conn = self._db.conn()
+        now = time.time()
+        text_hash = hashlib.sha256(f"{research_token or ''}\n{text.strip()}".encode("utf-8")).hexdigest()
+        conn.execute("DELETE FROM factcheck_results WHERE job_id IN (SELECT id FROM factcheck_jobs WHERE created_at < ?)",
+                     (now - settings.factcheck_job_ttl,))
+        conn.execute("DELETE FROM factcheck_jobs WHERE created_at < ?", (now - settings.factcheck_job_ttl,))
+        row = conn.execute(
+            "SELECT id, status, updated_at FROM factcheck_jobs WHERE text_hash=? AND status != 'failed' "
+            "ORDER BY created_at DESC LIMIT 1",
+            (text_hash,),
+        ).fetchone()
+        if row:
+            job_id, status, updated_at = row
+            # running or done: nothing for a new task to do
+            if status == "queued" or (status == "running" and updated_at < now - STALE_AFTER):
+                self._spawn(job_id)
+            return job_id
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO factcheck_jobs (id, text_hash, text, research_token, status, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,?,?)",
+            (job_id, text_hash, text, research_token or None, "queued", now, now),
+        )
+        self._spawn(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        conn = self._db.conn()
+        row = conn.execute(
+            "SELECT status, claims, error FROM factcheck_jobs WHERE id=?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        claims: List[str] = json.loads(row[1]) if row[1] else []
+        audits: List[Optional[Dict]] = [None] * len(claims)
+        for idx, audit in conn.execute("SELECT idx, audit FROM factcheck_results WHERE job_id=?", (job_id,)):
+            if idx < len(audits):
+                audits[idx] = json.loads(audit)
+        return {
+            "job_id": job_id,
+            "status": row[0],
+            "claims": claims,
+            "audits": audits,
+            "completed": sum(1 for a in audits if a is not None),
+            "error": row[2],
+        }
+
+    def _claim(self, job_id: str) -> bool:
+        now = time.time()
+        cur = self._db.conn().execute(
+            "UPDATE factcheck_jobs SET status='running', owner=?, updated_at=? "
+            "WHERE id=? AND (status='queued' OR (status='running' AND updated_at < ?))",
+            (self._owner, now, job_id, now - STALE_AFTER),
+        )
+        return cur.rowcount == 1
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k}=?" for k in fields)
+        self._db.conn().execute(f"UPDATE factcheck_jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+    def _save_result(self, job_id: str, idx: int, audit: Dict) -> None:
+        self._db.conn().execute(
+            "INSERT OR REPLACE INTO factcheck_results (job_id, idx, audit) VALUES (?,?,?)",
+            (job_id, idx, json.dumps(audit, ensure_ascii=False)),
+        )
+        self._update(job_id)  # heartbeat
+
+    # ---------------------------
+    # Workers
+    # ---------------------------
+    def _spawn(self, job_id: str) -> None:
+        if job_id in self._spawned:
+            return  # already waiting for a worker slot here
+        task = asyncio.get_running_loop().create_task(self._run(job_id))
+        self._tasks.add(task)
+        self._spawned.add(job_id)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._spawned.discard(job_id))
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT)
+            self._update(job_id)
+
+    async def _run(self, job_id: str) -> None:
+        deadline.detach()  # the submitting request's deadline doesn't bind the job
+        profiling.detach()
+        async with self._semaphore():
+            if not self._claim(job_id):
+                return  # done, or another worker has it
+            conn = self._db.conn()
+            text, claims, research_token = conn.execute(
+                "SELECT text, claims, research_token FROM factcheck_jobs WHERE id=?", (job_id,)
+            ).fetchone()
+            if claims is None:
+                conn.execute("DELETE FROM factcheck_results WHERE job_id=?", (job_id,))
+            beat = asyncio.get_running_loop().create_task(self._heartbeat(job_id))
+            try:
+                await audit_text_async(
+                    text,
+                    claims=json.loads(claims) if claims else None,  # resumed job: keep its claim list
+                    evidence=load_research(research_token),
+                    on_claims=lambda claims: self._update(job_id, claims=json.dumps(claims, ensure_ascii=False)),
+                    on_audit=lambda idx, audit: self._save_result(job_id, idx, audit),
+                )
+                self._update(job_id, status="done")
+            except asyncio.CancelledError:
+                self._update(job_id, status="queued", owner=None)  # resumed on next start
+                raise
+            except Exception as e:
+                self._update(job_id, status="failed", error=str(e))
+            finally:
+                beat.cancel()
+
+    def resume(self) -> None:
+        """
+        Re-queue jobs left queued (or orphaned while running) by a previous process.
+        """
+        rows = self._db.conn().execute(
+            "SELECT id FROM factcheck_jobs WHERE status='queued' OR (status='running' AND updated_at < ?)",
+            (time.time() - STALE_AFTER,),
+        ).fetchall()
+        for (job_id,) in rows:
+            self._spawn(job_id)
+
+    async def shutdown(self) -> None:
+        for t in list(self._tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+factcheck_jobs = FactcheckJobs(settings.jobs_db_path, settings.factcheck_job_workers)
@@ -0,0 +1,223 @@
+# app/services/metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+from starlette.routing import Match
+
+# Minimal Prometheus text-format metrics (no client library needed). Updates are
+# a dict lookup plus an add under a lock, cheap enough for the hot path.
+# Values are per process; scrape each worker or run one worker per container.
+
+_REGISTRY: List["_Metric"] = []
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self._header()
+        for k, v in items:
+            cumulative = 0
+            for b, c in zip(self.buckets, v):
+                cumulative += c
+                le = 'le="%s"' % _fmt_value(b)
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, k, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, k, inf)} {v[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, k)} {_fmt_value(v[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, k)} {v[-1]}")
+        return lines
+
+def render_latest() -> str:
+    lines: List[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------------------
+# App metrics
+# ---------------------------
+HTTP_REQUESTS = Counter("autocreator_http_requests_total", "HTTP requests by route and status.", ["route", "method", "status"])
+HTTP_LATENCY = Histogram("autocreator_http_request_seconds", "HTTP request latency (until the body is sent).", ["route", "method"])
+HTTP_IN_FLIGHT = Gauge("autocreator_http_requests_in_flight", "HTTP requests currently being served.", ["route"])
+TEMPLATE_RENDER = Histogram("autocreator_template_render_seconds", "Jinja template render time.", ["template"],
+                            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+OPENAI_LATENCY = Histogram("autocreator_openai_request_seconds", "OpenAI chat completion latency.", ["model", "op", "platform"])
+OPENAI_TOKENS = Counter("autocreator_openai_tokens_total", "OpenAI token usage reported by responses (kind: prompt, cached, completion).", ["model", "kind"])
+PROMPT_TRIMS = Counter("autocreator_prompt_research_trimmed_total", "Research-pack refs dropped to fit PROMPT_TOKEN_BUDGET.", ["mode"])
+LLM_FALLBACKS = Counter("autocreator_llm_fallbacks_total", "Draft generations that moved on to a fallback model.", ["model", "platform"])
+OPENAI_CONCURRENCY_LIMIT = Gauge("autocreator_openai_concurrency_limit", "Current adaptive (AIMD) concurrency limit per model.", ["model"])
+OPENAI_QUEUE_WAIT = Histogram("autocreator_openai_queue_seconds", "Time OpenAI calls waited for admission.", ["model", "priority"])
+OPENAI_RETRIES = Counter("autocreator_openai_retries_total", "OpenAI calls retried (or backed off) by reason.", ["model", "reason"])
+LLM_HEDGES = Counter("autocreator_llm_hedges_total", "Draft generations that started a hedged fallback request.", ["platform"])
+LLM_HEDGE_WINS = Counter("autocreator_llm_hedge_wins_total", "Which model answered first in a hedged generation.", ["winner", "platform"])
+CLAIM_SOURCES = Counter("autocreator_factcheck_claim_sources_total", "Where audited claim lists came from (draft or extracted).", ["source"])
+DRAFTS = Counter("autocreator_drafts_generated_total", "Successful draft generations.", ["platform", "mode"])
+
+SERPAPI_LATENCY = Histogram("autocreator_serpapi_request_seconds", "SerpApi search latency (network calls only).")
+BLUESKY_LATENCY = Histogram("autocreator_bluesky_request_seconds", "Bluesky XRPC latency.", ["op"])
+OUTBOX_POSTS = Counter("autocreator_outbox_posts_total", "Publish outbox outcomes (queued, duplicate, sent, retried, failed).", ["outcome"])
+OUTBOX_PENDING = Gauge("autocreator_outbox_pending", "Outbox entries not yet sent or failed (including scheduled ones).")
+
+UPSTREAM_ERRORS = Counter("autocreator_upstream_errors_total", "Failed upstream calls.", ["upstream"])
+CACHE_LOOKUPS = Counter("autocreator_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"])
+DEGRADATIONS = Counter("autocreator_degradations_total", "Responses reduced to stay within the request deadline, by what was dropped.", ["kind"])
+DEADLINES_EXCEEDED = Counter("autocreator_deadlines_exceeded_total", "Calls abandoned because the request deadline ran out.", ["op"])
+LOCAL_EVIDENCE = Counter("autocreator_local_evidence_total", "Claims checked against the local evidence index, by whether it was enough to skip the web search.", ["result"])
+RESEARCH_PREFETCHES = Counter("autocreator_research_prefetches_total", "Speculative research prefetches by outcome (started, used, wasted, rejected, failed).", ["outcome"])
+PROFILES_SAVED = Counter("autocreator_profiles_saved_total", "Request profiles written to the ring buffer, by why (header, sampled, slow).", ["reason"])
+COALESCED_CALLS = Counter("autocreator_coalesced_calls_total", "Calls that joined an identical in-flight upstream call instead of making their own.", ["op"])
+
+@contextmanager
+def upstream_call(upstream: str, hist: Histogram, **labels):
+    """
+    Time one outbound call into `hist`; failures also count in UPSTREAM_ERRORS.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:  # cancellation is not an upstream failure
+        UPSTREAM_ERRORS.inc(upstream=upstream)
+        raise
+    finally:
+        hist.observe(time.perf_counter() - start, **labels)
+
+def record_usage(model: str, usage) -> None:
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+    # prompt_tokens_details isn't a typed field in this SDK version: dict or object
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)
+    OPENAI_TOKENS.inc(cached or 0, model=model, kind="cached")
+    OPENAI_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: per-route latency, status counts and in-flight gauge.
+    The route label is the path template (/factcheck/jobs/{job_id}), never the raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route(self, scope) -> str:
+        for r in scope["app"].router.routes:
+            match, _ = r.matches(scope)
+            if match == Match.FULL:
+                return getattr(r, "path", "other")
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = self._route(scope)
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+            HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=method)
+            HTTP_REQUESTS.inc(route=route, method=method, status=str(status["code"]))
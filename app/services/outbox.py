@@ -0,0 +1,379 @@
+# app/services/outbox.py
+import asyncio
+import hashlib
+import os
+import random
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+from app.config import settings
+from app.models.schemas import PublishResponse
+from app.services.metrics import OUTBOX_PENDING, OUTBOX_POSTS
+from app.services.publish import error_message, find_post, permalink, post_bluesky
+from app.services.store import LocalDB
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS publish_outbox (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    handle TEXT NOT NULL,
+    text TEXT NOT NULL,
+    rkey TEXT NOT NULL,              -- record key picked up front: a retry can check whether the post landed
+    status TEXT NOT NULL,            -- queued | sending | sent | failed
+    not_before REAL NOT NULL,        -- scheduled time, pushed back by retries
+    attempts INTEGER NOT NULL DEFAULT 0,
+    attempt_limit INTEGER NOT NULL,
+    uri TEXT,
+    permalink TEXT,
+    error TEXT,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS publish_outbox_due ON publish_outbox (status, not_before);
+-- one row: the posts-per-hour bucket every process draining the outbox takes from
+CREATE TABLE IF NOT EXISTS publish_pacing (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    tokens REAL NOT NULL,
+    refilled_at REAL NOT NULL,
+    blocked_until REAL NOT NULL      -- from the last 429
+);
+"""
+
+# a "sending" entry untouched for this long is assumed orphaned (worker died
+# mid-post); well above the HTTP timeout so a slow post isn't sent twice
+STALE_AFTER = 300
+AUTO_KEY = "auto:"   # prefix of the keys submit() makes up from handle and text
+IDLE_POLL = 5.0      # re-check for due entries (other processes, schedules) at least this often
+MAX_BACKOFF = 900.0
+
+_TID_CHARS = "234567abcdefghijklmnopqrstuvwxyz"
+
+def new_rkey() -> str:
+    """
+    A TID, the record-key format posts use: microseconds since the epoch plus
+    a random 10-bit clock id, as 13 sortable base32 characters.
+    """
+    n = (time.time_ns() // 1000) << 10 | random.getrandbits(10)
+    chars = []
+    for _ in range(13):
+        chars.append(_TID_CHARS[n & 31])
+        n >>= 5
+    return "".join(reversed(chars))
+
+def _backoff(attempt: int) -> float:
+    return min(MAX_BACKOFF, 5.0 * 2 ** max(0, attempt - 1)) * random.uniform(1.0, 1.25)
+
+def _retry_delay(err: Exception, attempt: int) -> Tuple[Optional[float], bool]:
+    """
+    (seconds before the next attempt or None if retrying can't help, rate limited?).
+    Bad requests, rejected credentials and oversized posts fail for good.
+    """
+    from atproto.exceptions import NetworkError
+
+    resp = getattr(err, "response", None)
+    status = getattr(resp, "status_code", None)
+    if status == 429:
+        headers = getattr(resp, "headers", None) or {}
+        try:
+            if headers.get("ratelimit-reset"):  # epoch seconds when the window resets
+                return max(1.0, float(headers["ratelimit-reset"]) - time.time()), True
+            if headers.get("retry-after"):
+                return max(1.0, float(headers["retry-after"])), True
+        except ValueError:
+            pass
+        return _backoff(attempt), True
+    if (status is not None and status >= 500) or (isinstance(err, NetworkError) and status != 413):
+        return _backoff(attempt), False
+    return None, False
+
+async def _wait_event(event: asyncio.Event, timeout: float) -> None:
+    # not wait_for: before 3.12 it can swallow a cancel that lands as the event is set
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({waiter}, timeout=timeout)
+    finally:
+        waiter.cancel()
+
+class PublishOutbox:
+    """
+    Posts on their way to Bluesky. Entries live in SQLite, so a publish click
+    returns as soon as the post is queued and a restart loses nothing. One
+    worker per process drains due entries through the shared session. The
+    BLUESKY_POSTS_PER_HOUR bucket and 429 blocks live in the same database,
+    so all processes together stay within the limit; they back off on 429s
+    and server errors.
+    """
+
+    def __init__(self, path: str, posts_per_hour: int, burst: int):
+        self._db = LocalDB(path, OUTBOX_SCHEMA)
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._rate = max(1, posts_per_hour) / 3600.0
+        self._burst = max(1, burst)
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._done: Dict[str, asyncio.Event] = {}
+
+    # ---------------------------
+    # Store
+    # ---------------------------
+    def submit(self, text: str, handle: Optional[str] = None, publish_at: Optional[float] = None,
+               key: Optional[str] = None) -> Dict:
+        """
+        Queue `text` for posting at `publish_at` (epoch seconds; default now).
+        The same idempotency key returns the existing entry instead of posting
+        twice, for as long as it is kept (OUTBOX_TTL); a failed entry is
+        re-queued. Without a key, the same handle and text only count as a
+        repeat within OUTBOX_DEDUPE_WINDOW (a double click), so the same post
+        can be sent again deliberately later.
+        """
+        handle = handle or settings.bluesky_handle
+        conn = self._db.conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")  # a double click landing on two workers must see one entry
+        try:
+            conn.execute("DELETE FROM publish_outbox WHERE status IN ('sent', 'failed') AND updated_at < ?",
+                         (now - settings.outbox_ttl,))
+            if key is None:
+                key = self._recent_key(conn, handle, text, now)
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO publish_outbox (id, idempotency_key, handle, text, rkey, status, not_before, "
+                "attempt_limit, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (uuid.uuid4().hex, key, handle, text, new_rkey(), "queued", publish_at or now,
+                 settings.outbox_max_attempts, now, now),
+            )
+            inserted = cur.rowcount == 1
+            entry_id, status = conn.execute(
+                "SELECT id, status FROM publish_outbox WHERE idempotency_key=?", (key,)
+            ).fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        if inserted:
+            OUTBOX_POSTS.inc(outcome="queued")
+        elif status == "failed":
+            # same rkey, fresh attempt budget
+            conn.execute(
+                "UPDATE publish_outbox SET status='queued', error=NULL, not_before=?, "
+                "attempt_limit=attempts + ?, updated_at=? WHERE id=? AND status='failed'",
+                (publish_at or now, settings.outbox_max_attempts, now, entry_id),
+            )
+            OUTBOX_POSTS.inc(outcome="queued")
+        else:
+            OUTBOX_POSTS.inc(outcome="duplicate")
+        self._refresh_pending()
+        if self._wake is not None:
+            self._wake.set()
+        return self.get(entry_id)
+
+    def _recent_key(self, conn, handle: str, text: str, now: float) -> str:
+        """
+        Key of the entry with this handle and text queued within the dedupe
+        window, else a new one (content hash plus a unique suffix).
+        """
+        prefix = AUTO_KEY + hashlib.sha256(f"{handle}\n{text.strip()}".encode("utf-8")).hexdigest() + ":"
+        row = conn.execute(
+            "SELECT idempotency_key FROM publish_outbox WHERE idempotency_key >= ? AND idempotency_key < ? "
+            "AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+            (prefix, prefix[:-1] + ";", now - settings.outbox_dedupe_window),
+        ).fetchone()
+        return row[0] if row else prefix + uuid.uuid4().hex
+
+    def get(self, entry_id: str) -> Optional[Dict]:
+        row = self._db.conn().execute(
+            "SELECT id, status, handle, not_before, attempts, uri, permalink, error, created_at, updated_at "
+            "FROM publish_outbox WHERE id=?", (entry_id,)
+        ).fetchone()
+        if not row:
+            return None
+        keys = ("id", "status", "handle", "not_before", "attempts", "uri", "permalink", "error", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    async def wait(self, entry_id: str, timeout: float) -> Optional[Dict]:
+        """
+        The entry once sent or failed, or as it stands after `timeout` seconds.
+        """
+        done = self._done.setdefault(entry_id, asyncio.Event())
+        entry = self.get(entry_id)
+        if entry and entry["status"] not in ("sent", "failed") and timeout > 0:
+            await _wait_event(done, timeout)
+            entry = self.get(entry_id)
+        if entry is None or entry["status"] in ("sent", "failed"):
+            self._done.pop(entry_id, None)
+        return entry
+
+    def _update(self, entry_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k}=?" for k in fields)
+        self._db.conn().execute(f"UPDATE publish_outbox SET {cols} WHERE id=?", (*fields.values(), entry_id))
+
+    def _claim_next(self) -> Tuple[Optional[Tuple], float]:
+        """
+        In one transaction, claim the oldest due entry and take a pacing slot
+        for it: (entry, 0), or (None, seconds to wait) when nothing is due or
+        the shared bucket is empty.
+        """
+        conn = self._db.conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM publish_outbox WHERE (status='queued' AND not_before <= ?) "
+                "OR (status='sending' AND updated_at < ?) ORDER BY not_before LIMIT 1",
+                (now, now - STALE_AFTER),
+            ).fetchone()
+            tokens, blocked_until = self._bucket(conn, now)
+            delay = max(blocked_until - now, 0.0 if tokens >= 1 else (1 - tokens) / self._rate)
+            if row is None or delay > 0:
+                conn.execute("COMMIT")
+                return None, (self._next_due() if row is None else delay)
+            conn.execute(
+                "UPDATE publish_outbox SET status='sending', owner=?, attempts=attempts + 1, updated_at=? WHERE id=?",
+                (self._owner, now, row[0]),
+            )
+            conn.execute(
+                "INSERT INTO publish_pacing (id, tokens, refilled_at, blocked_until) VALUES (1,?,?,?) "
+                "ON CONFLICT(id) DO UPDATE SET tokens=excluded.tokens, refilled_at=excluded.refilled_at",
+                (tokens - 1, now, blocked_until),
+            )
+            entry = conn.execute(
+                "SELECT id, handle, text, rkey, attempts, attempt_limit FROM publish_outbox WHERE id=?", (row[0],)
+            ).fetchone()
+            conn.execute("COMMIT")
+            return entry, 0.0
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _next_due(self) -> float:
+        row = self._db.conn().execute("SELECT MIN(not_before) FROM publish_outbox WHERE status='queued'").fetchone()
+        if row[0] is None:
+            return IDLE_POLL
+        return min(IDLE_POLL, max(0.0, row[0] - time.time()))
+
+    def _refresh_pending(self) -> None:
+        row = self._db.conn().execute(
+            "SELECT COUNT(*) FROM publish_outbox WHERE status IN ('queued', 'sending')"
+        ).fetchone()
+        OUTBOX_PENDING.set(row[0])
+
+    def _finished(self, entry_id: str) -> None:
+        done = self._done.pop(entry_id, None)
+        if done is not None:
+            done.set()
+
+    # ---------------------------
+    # Worker
+    # ---------------------------
+    def _bucket(self, conn, now: float) -> Tuple[float, float]:
+        """
+        (tokens, blocked_until) of the shared pacing row, refilled up to `now`:
+        the posts-per-hour bucket (BLUESKY_POST_BURST deep) and the
+        Retry-After/reset block from the last 429.
+        """
+        row = conn.execute("SELECT tokens, refilled_at, blocked_until FROM publish_pacing WHERE id=1").fetchone()
+        if row is None:
+            return float(self._burst), 0.0
+        tokens, refilled_at, blocked_until = row
+        return min(float(self._burst), tokens + max(0.0, now - refilled_at) * self._rate), blocked_until
+
+    def _block(self, until: float) -> None:
+        self._db.conn().execute(
+            "INSERT INTO publish_pacing (id, tokens, refilled_at, blocked_until) VALUES (1,?,?,?) "
+            "ON CONFLICT(id) DO UPDATE SET blocked_until=max(blocked_until, excluded.blocked_until)",
+            (float(self._burst), time.time(), until),
+        )
+
+    async def _sleep(self, seconds: float) -> None:
+        await _wait_event(self._wake, seconds)
+
+    async def _drain(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                entry, idle = self._claim_next()
+                self._refresh_pending()
+            except Exception:  # e.g. the database is locked by another process; try again shortly
+                entry, idle = None, IDLE_POLL
+            if entry is None:
+                await self._sleep(idle)
+                continue
+            try:
+                await self._send(*entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # left "sending"; picked up again once stale
+
+    async def _send(self, entry_id: str, handle: str, text: str, rkey: str, attempts: int, limit: int) -> None:
+        try:
+            uri = None
+            if attempts > 1:  # an earlier attempt may have landed before it failed or its worker died
+                uri = await asyncio.to_thread(find_post, rkey, handle)
+            if uri is None:
+                uri = await asyncio.to_thread(post_bluesky, text, handle, rkey)
+        except asyncio.CancelledError:
+            self._update(entry_id, status="queued", owner=None)  # picked up again on next start
+            raise
+        except Exception as e:
+            delay, rate_limited = _retry_delay(e, attempts)
+            if rate_limited:
+                self._block(time.time() + delay)
+            if delay is None or attempts >= limit:
+                self._update(entry_id, status="failed", error=error_message(e), owner=None)
+                OUTBOX_POSTS.inc(outcome="failed")
+                self._finished(entry_id)
+            else:
+                self._update(entry_id, status="queued", error=error_message(e), owner=None,
+                             not_before=time.time() + delay)
+                OUTBOX_POSTS.inc(outcome="retried")
+            return
+        self._update(entry_id, status="sent", uri=uri, permalink=permalink(handle, uri), error=None, owner=None)
+        OUTBOX_POSTS.inc(outcome="sent")
+        self._finished(entry_id)
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        conn = self._db.conn()
+        now = time.time()
+        rows = conn.execute("SELECT status, COUNT(*) FROM publish_outbox GROUP BY status").fetchall()
+        tokens, blocked_until = self._bucket(conn, now)
+        return {
+            "counts": dict(rows),
+            "next_due_in": round(self._next_due(), 2),
+            "blocked_for": round(max(0.0, blocked_until - now), 2),
+            "posts_per_hour": round(self._rate * 3600),
+            "burst_available": round(tokens, 2),
+        }
+
+def as_response(entry: Optional[Dict]) -> PublishResponse:
+    """
+    What the publish form shows for an outbox entry.
+    """
+    if entry is None:
+        return PublishResponse(ok=False, message="Bluesky error: outbox entry not found")
+    if entry["status"] == "sent":
+        return PublishResponse(ok=True, permalink=entry["permalink"])
+    if entry["status"] == "failed":
+        return PublishResponse(ok=False, message=f"Bluesky error: {entry['error']}")
+    if entry["error"]:
+        message = f"Queued; retrying after: {entry['error']}"
+    elif entry["not_before"] > time.time() + 1:
+        message = time.strftime("Scheduled for %Y-%m-%d %H:%M UTC", time.gmtime(entry["not_before"]))
+    else:
+        message = "Queued; posting shortly"
+    return PublishResponse(ok=True, outbox_id=entry["id"], message=message)
+
+publish_outbox = PublishOutbox(settings.outbox_db_path, settings.bluesky_posts_per_hour, settings.bluesky_post_burst)
@@ -0,0 +1,227 @@
+# app/services/profiling.py
+import asyncio
+import contextvars
+import functools
+import glob
+import json
+import os
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from app.config import settings
+from app.services.metrics import PROFILES_SAVED
+
+# Wall-clock span trees per request. ProfilingMiddleware opens a root span when
+# a request is profiled (X-Profile header, PROFILE_SAMPLE_RATE, or PROFILE_SLOW_MS
+# slow capture); span()/@traced add children through a context variable, so
+# tasks the request starts record under it too. Unprofiled requests pay one
+# context variable lookup per traced call.
+
+class Span:
+    __slots__ = ("name", "start", "end", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float, stop: float) -> Optional[Dict]:
+        # spans still open when the request ended (a shared call it left behind) are cut there
+        if self.start > stop:
+            return None
+        end = min(self.end or stop, stop)
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "ms": round((end - self.start) * 1000, 3),
+            "children": [d for d in (c.to_dict(origin, stop) for c in self.children) if d is not None],
+        }
+
+_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("profile_span", default=None)
+
+def detach() -> None:
+    # for background work started by a request that outlives it; its profile is already saved
+    _span.set(None)
+
+@contextmanager
+def span(name: str):
+    parent = _span.get()
+    if parent is None:
+        yield
+        return
+    s = Span(name)
+    parent.children.append(s)
+    token = _span.set(s)
+    try:
+        yield
+    finally:
+        s.end = time.perf_counter()
+        _span.reset(token)
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Record each call of the decorated function (sync or async) as a span.
+    """
+    def wrap(fn: Callable) -> Callable:
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
+
+def collapsed(tree: Dict) -> str:
+    """
+    Collapsed-stack lines ("root;child;leaf <self µs>") for flamegraph.pl,
+    inferno or speedscope. Self time is a span's wall time minus its
+    children's; concurrent children can cover more than their parent, so
+    such parents show no self time.
+    """
+    totals: Dict[str, int] = defaultdict(int)
+
+    def walk(node: Dict, stack: List[str]) -> None:
+        stack = stack + [node["name"].replace(";", ",")]
+        self_ms = node["ms"] - sum(c["ms"] for c in node["children"])
+        totals[";".join(stack)] += max(0, round(self_ms * 1000))
+        for child in node["children"]:
+            walk(child, stack)
+
+    walk(tree, [])
+    return "".join(f"{stack} {us}\n" for stack, us in totals.items())
+
+# ---------------------------
+# On-disk ring buffer
+# ---------------------------
+_PROFILE_ID = re.compile(r"^[0-9a-f]{12}$")
+
+class ProfileStore:
+    """
+    One JSON file per saved profile in PROFILE_DIR (shared by workers), named
+    so they sort by time; past PROFILE_KEEP the oldest are deleted. A keep of
+    0 or less keeps every profile (nothing is pruned).
+    """
+
+    def __init__(self, path: str, keep: int):
+        self.path = path
+        self.keep = keep
+
+    def save(self, profile: Dict) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        name = f"{int(profile['started_at'] * 1000):015d}-{profile['id']}.json"
+        tmp = os.path.join(self.path, f".{name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.path, name))
+        if self.keep <= 0:
+            return  # unlimited
+        for old in self._files()[:-self.keep]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass  # another worker got there first
+
+    def _files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.path, "*.json")))
+
+    def list(self) -> List[Dict]:
+        """
+        Summaries of the saved profiles, newest first.
+        """
+        out = []
+        for path in reversed(self._files()):
+            p = self._read(path)
+            if p is not None:
+                out.append({k: p[k] for k in ("id", "method", "path", "status", "ms", "reason", "started_at")})
+        return out
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        paths = glob.glob(os.path.join(self.path, f"*-{profile_id}.json"))
+        return self._read(paths[0]) if paths else None
+
+    def _read(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None  # rotated away while listing
+
+profile_store = ProfileStore(settings.profile_dir, settings.profile_keep)
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: profiles requests asked for with X-Profile: 1 (when
+    PROFILE_HEADER is on) or picked by PROFILE_SAMPLE_RATE, and saves them;
+    with PROFILE_SLOW_MS set, every request is recorded and kept only if it
+    took at least that long. All three are off by default. Saved profiles' ids go out as X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _reason(self, scope) -> Optional[str]:
+        if settings.profile_header:
+            for name, value in scope["headers"]:
+                if name == b"x-profile" and value.lower() in (b"1", b"true"):
+                    return "header"
+        if settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate:
+            return "sampled"
+        if settings.profile_slow_ms > 0:
+            return "slow"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        reason = self._reason(scope) if scope["type"] == "http" else None
+        if reason is None:
+            return await self.app(scope, receive, send)
+        profile_id = uuid.uuid4().hex[:12]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if reason != "slow":
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        started_at = time.time()
+        root = Span(f"{scope['method']} {scope['path']}")
+        token = _span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root.end = time.perf_counter()
+            _span.reset(token)
+            ms = (root.end - root.start) * 1000
+            slow = settings.profile_slow_ms > 0 and ms >= settings.profile_slow_ms
+            if reason != "slow" or slow:
+                reason = "slow" if slow else reason
+                profile = {
+                    "id": profile_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "ms": round(ms, 3),
+                    "reason": reason,
+                    "started_at": started_at,
+                    "tree": root.to_dict(root.start, root.end),
+                }
+                try:
+                    await asyncio.to_thread(profile_store.save, profile)
+                    PROFILES_SAVED.inc(reason=reason)
+                except OSError:
+                    pass  # profiling must never fail the request
@@ -1,16 +1,180 @@
-from atproto import Client
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 from app.config import settings
 from app.models.schemas import PublishResponse
+from app.services.metrics import BLUESKY_LATENCY, upstream_call
+
+if TYPE_CHECKING:
+    from atproto import Client
+
+def load_sdk() -> None:
+    """
+    Import atproto (several seconds: it loads every lexicon model). Done on the
+    first publish, or up front by the WARMUP lifespan hook.
+    """
+    import atproto  # noqa: F401
+
+# ---------------------------
+# Bluesky sessions
+# ---------------------------
+# One logged-in Client per handle, reused across posts. The session string is
+# persisted on every create/refresh so a restart resumes it instead of calling
+# createSession again (which is heavily rate limited). atproto refreshes the
+# access JWT itself before a request once it is about to expire.
+_clients: Dict[str, "Client"] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+def _handle_lock(handle: str) -> threading.Lock:
+    with _registry_lock:
+        return _locks.setdefault(handle, threading.Lock())
+
+def _session_path(handle: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", handle)
+    return os.path.join(settings.bluesky_session_dir, f"{safe}.session")
+
+def _load_session(handle: str) -> Optional[str]:
+    try:
+        with open(_session_path(handle), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _save_session(handle: str, session_string: str) -> None:
+    path = _session_path(handle)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # holds tokens
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(session_string)
+    os.replace(tmp, path)
+
+def _drop_session(handle: str) -> None:
+    _clients.pop(handle, None)
+    try:
+        os.remove(_session_path(handle))
+    except OSError:
+        pass
+
+def _login(handle: str, password: str) -> "Client":
+    from atproto import Client
+
+    client = Client(base_url=settings.bluesky_base_url or None)
+
+    def on_session_change(event, session):
+        _save_session(handle, session.export())
+
+    client.on_session_change(on_session_change)
+
+    saved = _load_session(handle)
+    if saved:
+        try:
+            with upstream_call("bluesky", BLUESKY_LATENCY, op="login"):
+                client.login(session_string=saved)
+            return client
+        except Exception:
+            pass  # refresh token expired or revoked: fall back to a password login
+    with upstream_call("bluesky", BLUESKY_LATENCY, op="login"):
+        client.login(handle, password)
+    return client
+
+def _send_post(client: "Client", text: str, rkey: Optional[str] = None):
+    with upstream_call("bluesky", BLUESKY_LATENCY, op="post"):
+        if rkey is None:
+            return client.send_post(text=text)
+        # the record send_post builds, under a record key chosen by the caller
+        from atproto import models
+
+        record = models.AppBskyFeedPost.Record(created_at=client.get_current_time_iso(), text=text, langs=["en"])
+        return client.app.bsky.feed.post.create(client.me.did, record, rkey=rkey)
+
+def get_bluesky_client(handle: Optional[str] = None, password: Optional[str] = None) -> "Client":
+    """
+    Authenticated Client for `handle`, created once per process and shared.
+    The per-handle lock makes concurrent publishers wait for a single login.
+    """
+    handle = handle or settings.bluesky_handle
+    password = password or settings.bluesky_app_password
+    client = _clients.get(handle)
+    if client is not None:
+        return client
+    with _handle_lock(handle):
+        client = _clients.get(handle)
+        if client is None:
+            client = _login(handle, password)
+            _clients[handle] = client
+    return client
+
+def permalink(handle: str, uri: Optional[str]) -> str:
+    return f"https://bsky.app/profile/{handle}/post/{uri.split('/')[-1] if uri else ''}"
+
+def error_message(err: Exception) -> str:
+    """
+    atproto errors carry the XRPC error in .response and have no message of their own.
+    """
+    resp = getattr(err, "response", None)
+    content = getattr(resp, "content", None)
+    parts = [p for p in (getattr(content, "error", None), getattr(content, "message", None)) if isinstance(p, str) and p]
+    if parts:
+        return ": ".join(parts)
+    if resp is not None:
+        return f"HTTP {resp.status_code}"
+    return str(err) or type(err).__name__
+
+def _with_session(handle: str, op: Callable[["Client"], Any]) -> Any:
+    """
+    op(client) with the shared session; if the server has revoked or expired
+    it, log in once more and retry.
+    """
+    from atproto.exceptions import BadRequestError, LoginRequiredError, UnauthorizedError
+
+    client = get_bluesky_client(handle)
+    try:
+        return op(client)
+    except (UnauthorizedError, LoginRequiredError, BadRequestError) as e:
+        if isinstance(e, BadRequestError) and "token" not in error_message(e).lower():
+            raise
+        with _handle_lock(handle):
+            if _clients.get(handle) is client:
+                _drop_session(handle)
+        return op(get_bluesky_client(handle))
+
+def post_bluesky(text: str, handle: Optional[str] = None, rkey: Optional[str] = None) -> str:
+    """
+    Post `text` and return its at:// URI; raises on failure. A fixed `rkey`
+    lets a retry check with find_post() whether the first attempt landed.
+    """
+    post = _with_session(handle or settings.bluesky_handle, lambda c: _send_post(c, text, rkey))
+    return getattr(post, "uri", None) or ""
+
+def find_post(rkey: str, handle: Optional[str] = None) -> Optional[str]:
+    """
+    URI of the handle's post with record key `rkey`, or None if there is none.
+    """
+    from atproto.exceptions import BadRequestError
+
+    def get(client: "Client"):
+        with upstream_call("bluesky", BLUESKY_LATENCY, op="get_post"):
+            return client.get_post(rkey, client.me.did)
+
+    try:
+        return _with_session(handle or settings.bluesky_handle, get).uri
+    except BadRequestError as e:
+        if error_message(e).startswith("RecordNotFound"):
+            return None
+        raise
 
 def publish_bluesky(text: str) -> PublishResponse:
+    """
+    Post right away; the web routes queue through the outbox instead.
+    """
+    handle = settings.bluesky_handle
     try:
-        client = Client()
-        client.login(settings.bluesky_handle, settings.bluesky_app_password)
-        post = client.send_post(text=text)
-        uri = getattr(post, "uri", None)
-        return PublishResponse(ok=True, permalink=f"https://bsky.app/profile/{settings.bluesky_handle}/post/{uri.split('/')[-1] if uri else ''}")
+        return PublishResponse(ok=True, permalink=permalink(handle, post_bluesky(text, handle)))
     except Exception as e:
-        return PublishResponse(ok=False, message=f"Bluesky error: {e}")
+        return PublishResponse(ok=False, message=f"Bluesky error: {error_message(e)}")
 
 def export_linkedin_text(text: str) -> PublishResponse:
     # We return the text to the UI; user clicks "Copy" to clipboard.
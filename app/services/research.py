@@ -0,0 +1,145 @@
+# app/services/research.py
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+from app.config import settings
+from app.services.cache import TieredCache, make_key, normalize_query
+from app.services.factcheck import search_cache, serpapi_search_async
+from app.services.metrics import RESEARCH_PREFETCHES
+from app.services import deadline, profiling
+from app.services.profiling import traced
+
+PACK_SIZE = 5
+
+# research packs by session token, so fact-checks of the resulting draft can use
+# them as evidence instead of searching again (shared by all workers via SQLite)
+research_store = TieredCache("research", settings.cache_db_path, ttl=settings.research_session_ttl, max_memory=256)
+
+# prefetch bookkeeping by query: "pending" once started, then "used" or "failed"
+# (shared by workers, so the one a generate call lands on can settle it). The
+# results themselves are in the SerpApi search cache; kept past the TTL so the
+# sweep still sees what happened to a prefetch.
+prefetch_marks = TieredCache("prefetch", settings.cache_db_path, ttl=2 * settings.research_prefetch_ttl, max_memory=256)
+
+def research_query(topic: str, angle: str = "") -> str:
+    return f"{topic} {angle or ''}".strip()
+
+def _prefetch_key(q: str, num: int) -> str:
+    return make_key(normalize_query(q), num)
+
+class ResearchPrefetcher:
+    """
+    Speculative research: the topic form asks for a prefetch when its topic or
+    angle field loses focus, so by the time it is submitted research_pack()
+    finds the results in the search cache (or joins the search still in
+    flight). A prefetch nobody takes within RESEARCH_PREFETCH_TTL counts as
+    wasted. Needs the search cache (SEARCH_CACHE_TTL > 0) to hand results over.
+    Caps: RESEARCH_PREFETCH_MAX_PENDING untaken prefetches per client (the
+    form's client_id, else its address) and
+    RESEARCH_PREFETCH_MAX_INFLIGHT searches at once (per worker).
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Tuple[str, float]] = {}  # key -> (client, started at)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self, topic: str, angle: str = "", client: str = "") -> str:
+        """
+        Start fetching the research pack for this topic/angle in the background.
+        Returns "started", "duplicate", "rejected" (over a cap) or "disabled".
+        """
+        q = research_query(topic, angle)
+        if not (settings.research_prefetch and search_cache.enabled and settings.serpapi_key and q):
+            return "disabled"
+        key = _prefetch_key(q, PACK_SIZE)
+        self._sweep()
+        if key in self._pending or prefetch_marks.get(key) in ("pending", "used"):
+            return "duplicate"  # also what makes repeated blur events cheap
+        mine = sum(1 for c, _ in self._pending.values() if c == client)
+        if mine >= settings.research_prefetch_max_pending or len(self._tasks) >= settings.research_prefetch_max_inflight:
+            RESEARCH_PREFETCHES.inc(outcome="rejected")
+            return "rejected"
+        self._pending[key] = (client, time.time())
+        prefetch_marks.set(key, "pending")
+        task = asyncio.get_running_loop().create_task(self._fetch(key, q))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        RESEARCH_PREFETCHES.inc(outcome="started")
+        return "started"
+
+    async def _fetch(self, key: str, q: str) -> None:
+        deadline.detach()  # outlives the prefetch request
+        profiling.detach()
+        try:
+            await serpapi_search_async(q, num=PACK_SIZE)  # lands in the search cache
+        except Exception:
+            self._pending.pop(key, None)
+            prefetch_marks.set(key, "failed")
+            RESEARCH_PREFETCHES.inc(outcome="failed")
+
+    def take(self, q: str, num: int) -> bool:
+        """
+        Settle the prefetch for `q` as used, if there is one; the caller's own
+        search then finds its results cached, or joins it while in flight.
+        """
+        key = _prefetch_key(q, num)
+        self._pending.pop(key, None)
+        if prefetch_marks.get(key) != "pending":
+            return False
+        prefetch_marks.set(key, "used")  # so the worker that started it doesn't count it wasted
+        RESEARCH_PREFETCHES.inc(outcome="used")
+        return True
+
+    def _sweep(self) -> None:
+        cutoff = time.time() - settings.research_prefetch_ttl
+        for key, (_, started) in list(self._pending.items()):
+            if started < cutoff:
+                del self._pending[key]
+                if prefetch_marks.get(key) == "pending":
+                    RESEARCH_PREFETCHES.inc(outcome="wasted")
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        self._sweep()
+        outcomes = {o: int(RESEARCH_PREFETCHES.value(outcome=o)) for o in ("started", "used", "wasted", "rejected", "failed")}
+        settled = outcomes["used"] + outcomes["wasted"]
+        return {
+            "enabled": settings.research_prefetch and search_cache.enabled,
+            **outcomes,
+            "waste_rate": round(outcomes["wasted"] / settled, 4) if settled else 0.0,
+            "pending": len(self._pending),
+            "in_flight": len(self._tasks),
+        }
+
+research_prefetcher = ResearchPrefetcher()
+
+@traced()
+async def research_pack(topic: str, angle: str = "", num: int = PACK_SIZE) -> Tuple[List[Dict], str]:
+    """
+    Web results used to ground a topical draft, plus the de-duped
+    "a.com; b.org; c.net" domains string for the Sources line.
+    """
+    q = research_query(topic, angle)
+    research_prefetcher.take(q, num)
+    sources_used = await serpapi_search_async(q, num=num)
+    # Build de-duped domains string
+    domains = []
+    for s in sources_used:
+        d = urlparse(s.get("url", "")).netloc.replace("www.", "")
+        if d and d not in domains:
+            domains.append(d)
+    return sources_used, "; ".join(domains[:3])
+
+def save_research(sources: List[Dict]) -> str:
+    token = uuid.uuid4().hex
+    research_store.set(token, sources)
+    return token
+
+def load_research(token: Optional[str]) -> Optional[List[Dict]]:
+    return research_store.get(token) if token else None
@@ -0,0 +1,317 @@
+# app/services/scheduler.py
+import asyncio
+import contextvars
+import email.utils
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from openai import APIConnectionError, APIStatusError, RateLimitError
+from app.config import settings
+from app.services.tokens import count_tokens
+from app.services import deadline
+from app.services.metrics import OPENAI_CONCURRENCY_LIMIT, OPENAI_QUEUE_WAIT, OPENAI_RETRIES
+
+# Every OpenAI call goes through here. Per model it keeps
+#   - an AIMD concurrency limit: +1 per window of successes, halved on a 429
+#   - request-per-minute and token-per-minute budgets (token buckets)
+#   - a "blocked until" time from the last Retry-After, so one 429 pauses the
+#     whole model instead of every queued caller hitting it again
+# Waiters are admitted by priority (interactive before bulk), then FIFO.
+# The SDK's own retries are off (see clients.py); retries happen here.
+
+INTERACTIVE, BULK = 0, 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("openai_priority", default=INTERACTIVE)
+
+# completion length isn't known up front; reserve this much, settle on the real usage
+COMPLETION_ESTIMATE = 800
+MAX_BACKOFF = 60.0
+
+def estimate_tokens(prompt: str) -> int:
+    return count_tokens(prompt) + COMPLETION_ESTIMATE
+
+@contextmanager
+def priority(level: int):
+    """
+    Run the enclosed calls (and tasks created inside) at `level`.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def _model_limits() -> Dict[str, Tuple[int, int]]:
+    """
+    OPENAI_MODEL_LIMITS="gpt-5-mini:500:500000,gpt-5-nano:1000:2000000" (model:rpm:tpm).
+    """
+    out: Dict[str, Tuple[int, int]] = {}
+    for entry in settings.openai_model_limits.split(","):
+        parts = entry.strip().split(":")
+        if len(parts) == 3 and parts[0]:
+            out[parts[0]] = (int(parts[1] or 0), int(parts[2] or 0))
+    return out
+
+def retry_after(err: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying: the server's Retry-After (ms or seconds or
+    HTTP date) when present, else exponential backoff; jittered either way.
+    """
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    delay: Optional[float] = None
+    try:
+        if headers.get("retry-after-ms"):
+            delay = float(headers["retry-after-ms"]) / 1000
+        elif headers.get("retry-after"):
+            raw = headers["retry-after"]
+            try:
+                delay = float(raw)
+            except ValueError:
+                delay = email.utils.parsedate_to_datetime(raw).timestamp() - time.time()
+    except (TypeError, ValueError):
+        delay = None
+    if delay is None or delay < 0:
+        delay = 0.5 * 2 ** attempt
+    return min(MAX_BACKOFF, delay) * random.uniform(1.0, 1.25)
+
+def _retryable(err: Exception) -> bool:
+    if isinstance(err, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(err, APIStatusError) and err.status_code >= 500
+
+class _Bucket:
+    """
+    Per-minute budget refilled continuously. per_minute <= 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.ts = time.monotonic()
+        self._lock = threading.Lock()  # the sync path takes from it in worker threads
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def delay(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            need = min(amount, self.capacity) - self.level
+            return max(0.0, need / self.rate)
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            with self._lock:
+                self._refill(time.monotonic())
+                self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        # settle an estimate: positive returns unused budget, negative charges extra
+        if self.capacity > 0:
+            with self._lock:
+                self.level = min(self.capacity, self.level + amount)
+
+class _ModelState:
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.limit = float(max(1, settings.openai_concurrency_initial))
+        self.in_flight = 0
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.blocked_until = 0.0  # time.monotonic()
+        self.last_decrease = 0.0
+        self.waiters: List[tuple] = []  # heap of (priority, seq, future, tokens)
+        self.timer: Optional[asyncio.TimerHandle] = None
+        OPENAI_CONCURRENCY_LIMIT.set(self.limit, model=model)
+
+    def on_success(self) -> None:
+        # additive increase: about +1 once `limit` calls in a row have succeeded
+        self.limit = min(float(settings.openai_concurrency_max), self.limit + 1.0 / self.limit)
+        OPENAI_CONCURRENCY_LIMIT.set(round(self.limit, 2), model=self.model)
+
+    def on_rate_limited(self, wait: float) -> None:
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + wait)
+        # one halving per backoff window, not one per 429 in the same burst
+        if now - self.last_decrease > max(1.0, wait):
+            self.limit = max(1.0, self.limit / 2)
+            self.last_decrease = now
+            OPENAI_CONCURRENCY_LIMIT.set(round(self.limit, 2), model=self.model)
+
+class OpenAIScheduler:
+    def __init__(self):
+        self._states: Dict[str, _ModelState] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._limits = _model_limits()
+
+    def state(self, model: str) -> _ModelState:
+        st = self._states.get(model)
+        if st is None:
+            with self._lock:
+                st = self._states.get(model)
+                if st is None:
+                    rpm, tpm = self._limits.get(model, (settings.openai_rpm, settings.openai_tpm))
+                    st = self._states[model] = _ModelState(model, rpm, tpm)
+        return st
+
+    # ---------------------------
+    # Admission (async)
+    # ---------------------------
+    def _pump(self, st: _ModelState) -> None:
+        """
+        Admit waiters from the head of the heap while concurrency, budgets and
+        any Retry-After block allow; otherwise re-run when the blocker clears.
+        """
+        st.timer = None
+        while st.waiters:
+            prio, seq, fut, tokens = st.waiters[0]
+            if fut.done():  # cancelled while queued
+                heapq.heappop(st.waiters)
+                continue
+            if st.in_flight >= int(st.limit):
+                return  # a release will pump again
+            wait = max(st.blocked_until - time.monotonic(), st.requests.delay(1), st.tokens.delay(tokens))
+            if wait > 0:
+                st.timer = asyncio.get_running_loop().call_later(wait, self._pump, st)
+                return
+            heapq.heappop(st.waiters)
+            st.requests.take(1)
+            st.tokens.take(tokens)
+            st.in_flight += 1
+            fut.set_result(None)
+
+    async def _acquire(self, st: _ModelState, tokens: int) -> None:
+        prio = _priority.get()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(st.waiters, (prio, next(self._seq), fut, tokens))
+        if st.timer is None:
+            self._pump(st)
+        start = time.perf_counter()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release(st)  # admitted just as we were cancelled
+            raise
+        OPENAI_QUEUE_WAIT.observe(time.perf_counter() - start, model=st.model, priority=PRIORITY_NAMES[prio])
+
+    def _release(self, st: _ModelState) -> None:
+        st.in_flight -= 1
+        if st.timer is None:
+            self._pump(st)
+
+    @asynccontextmanager
+    async def slot(self, model: str, tokens: int):
+        """
+        Hold one admitted call for `model` (e.g. for the life of a stream).
+        A 429 raised inside still feeds the limiter; retrying is up to the caller.
+        """
+        st = self.state(model)
+        await self._acquire(st, tokens)
+        try:
+            yield st
+            st.on_success()
+        except RateLimitError as e:
+            st.on_rate_limited(retry_after(e, 0))
+            OPENAI_RETRIES.inc(model=model, reason="rate_limited")
+            raise
+        finally:
+            self._release(st)
+
+    async def run(self, model: str, call: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        """
+        Await `call()` under the model's limits, retrying 429s, 5xx and connection
+        errors up to OPENAI_MAX_RETRIES times. `call` must build a fresh request.
+        """
+        st = self.state(model)
+        attempt = 0
+        while True:
+            await self._acquire(st, tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                wait = retry_after(e, attempt)
+                if isinstance(e, RateLimitError):
+                    st.on_rate_limited(wait)
+                if attempt >= settings.openai_max_retries or not deadline.has_time(wait):
+                    raise  # out of retries, or the request's deadline would pass while waiting
+                OPENAI_RETRIES.inc(model=model, reason=_reason(e))
+                attempt += 1
+                if not isinstance(e, RateLimitError):
+                    await asyncio.sleep(wait)  # 429s wait in the queue via blocked_until
+                continue
+            finally:
+                self._release(st)
+            st.on_success()
+            self._settle(st, tokens, result)
+            return result
+
+    # ---------------------------
+    # Sync path (scripts, thread pools)
+    # ---------------------------
+    def run_sync(self, model: str, call: Callable[[], Any], tokens: int) -> Any:
+        """
+        Blocking twin of run(): honours the shared budgets and Retry-After
+        blocks with sleeps, but has no queue, so no priorities or AIMD cap.
+        """
+        st = self.state(model)
+        attempt = 0
+        while True:
+            wait = max(st.blocked_until - time.monotonic(), st.requests.delay(1), st.tokens.delay(tokens))
+            if wait > 0:
+                time.sleep(wait)
+            st.requests.take(1)
+            st.tokens.take(tokens)
+            try:
+                result = call()
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                wait = retry_after(e, attempt)
+                if isinstance(e, RateLimitError):
+                    st.on_rate_limited(wait)
+                if attempt >= settings.openai_max_retries or not deadline.has_time(wait):
+                    raise
+                OPENAI_RETRIES.inc(model=model, reason=_reason(e))
+                attempt += 1
+                if not isinstance(e, RateLimitError):
+                    time.sleep(wait)
+                continue
+            st.on_success()
+            self._settle(st, tokens, result)
+            return result
+
+    def _settle(self, st: _ModelState, estimated: int, result: Any) -> None:
+        usage = getattr(result, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if total:
+            st.tokens.give(estimated - total)
+
+    def stats(self) -> List[Dict]:
+        return [{
+            "model": st.model,
+            "concurrency_limit": round(st.limit, 2),
+            "in_flight": st.in_flight,
+            "queued": sum(1 for w in st.waiters if not w[2].done()),
+            "blocked_for": round(max(0.0, st.blocked_until - time.monotonic()), 2),
+        } for st in list(self._states.values())]
+
+def _reason(err: Exception) -> str:
+    if isinstance(err, RateLimitError):
+        return "rate_limited"
+    if isinstance(err, APIConnectionError):
+        return "connection"
+    return "server_error"
+
+openai_scheduler = OpenAIScheduler()
@@ -0,0 +1,165 @@
+# app/services/scoring.py
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# words, plus numbers with thousands/decimal separators ("1,200", "3.5")
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)*|[^\W\d_]+(?:'[^\W\d_]+)?", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from had has have he her his in into is it its
+of on or our she so than that the their them then there these they this those to was
+we were what when where which who will with you your
+""".split())
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+# confidence = FLOOR + SPAN * (1 - exp(-RATE * support)), where support sums the
+# coverage (0..1, the idf-weighted share of claim terms a document contains) of
+# the TOP_K best documents. No evidence is 0.4; one document covering every claim
+# term is about 0.77, two about 0.90, three exactly CEILING. SPAN is derived so
+# that TOP_K full documents reach CEILING.
+FLOOR, CEILING, RATE, TOP_K = 0.4, 0.95, 1.0, 3
+SPAN = (CEILING - FLOOR) / (1 - math.exp(-RATE * TOP_K))
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """
+    (term, start, end) for every indexable token. Whole tokens only, so "data"
+    does not match inside "database".
+    """
+    out = []
+    for m in _TOKEN.finditer(text or ""):
+        term = m.group(0).lower().replace(",", "")
+        if term in STOPWORDS or (len(term) < 2 and not term.isdigit()):
+            continue
+        out.append((term, m.start(), m.end()))
+    return out
+
+def claim_terms(claim: str) -> List[str]:
+    return list(dict.fromkeys(t for t, _, _ in tokenize(claim)))
+
+class EvidenceIndex:
+    """
+    Small in-memory inverted index over the search results of one audit.
+    Each result is tokenized once when added; claims are scored by walking the
+    postings of their own terms only, so the work grows with total tokens rather
+    than claims x results x terms.
+    """
+
+    def __init__(self, results: Optional[Iterable[Dict]] = None):
+        self.docs: List[Dict] = []
+        self._text: List[str] = []
+        self._offsets: List[Dict[str, List[Tuple[int, int]]]] = []
+        self._len: List[int] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._seen: Dict[str, int] = {}
+        if results:
+            self.add(results)
+
+    def add(self, results: Iterable[Dict]) -> List[int]:
+        """
+        Index results (deduped by url, else title+snippet); returns their doc ids.
+        """
+        ids = []
+        for r in results:
+            key = r.get("url") or f"{r.get('title','')}|{r.get('snippet','')}"
+            if key in self._seen:
+                ids.append(self._seen[key])
+                continue
+            doc_id = len(self.docs)
+            text = f"{r.get('title','')}\n{r.get('snippet','')}"
+            toks = tokenize(text)
+            offsets: Dict[str, List[Tuple[int, int]]] = {}
+            for term, start, end in toks:
+                offsets.setdefault(term, []).append((start, end))
+            for term, positions in offsets.items():
+                self._postings.setdefault(term, {})[doc_id] = len(positions)
+            self.docs.append(r)
+            self._text.append(text)
+            self._offsets.append(offsets)
+            self._len.append(len(toks))
+            self._seen[key] = doc_id
+            ids.append(doc_id)
+        return ids
+
+    def idf(self, term: str) -> float:
+        n = len(self.docs)
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _scores(self, terms: List[str], doc_ids: Optional[set]) -> Dict[int, list]:
+        avgdl = (sum(self._len) / len(self._len)) if self._len else 1.0
+        scores: Dict[int, list] = {}  # doc -> [bm25, matched idf, matched terms]
+        for t in terms:
+            postings = self._postings.get(t)
+            if not postings:
+                continue
+            idf = self.idf(t)
+            for d, tf in postings.items():
+                if doc_ids is not None and d not in doc_ids:
+                    continue
+                norm = K1 * (1 - B + B * self._len[d] / (avgdl or 1.0))
+                entry = scores.setdefault(d, [0.0, 0.0, []])
+                entry[0] += idf * tf * (K1 + 1) / (tf + norm)
+                entry[1] += idf
+                entry[2].append(t)
+        return scores
+
+    def _span(self, doc_id: int, matched: List[str], width: int = 160) -> str:
+        """
+        Densest window (<= width chars) of matched terms in the document text.
+        """
+        text = self._text[doc_id]
+        pos = sorted(p for t in matched for p in self._offsets[doc_id].get(t, ()))
+        if not pos:
+            return ""
+        best, lo = (0, pos[0][0], pos[0][1]), 0
+        for hi in range(len(pos)):
+            while pos[hi][1] - pos[lo][0] > width:
+                lo += 1
+            if hi - lo + 1 > best[0]:
+                best = (hi - lo + 1, pos[lo][0], pos[hi][1])
+        _, start, end = best
+        pad = max(0, (width - (end - start)) // 2)
+        start, end = max(0, start - pad), min(len(text), end + pad)
+        span = text[start:end].replace("\n", " — ").strip()
+        return ("…" if start > 0 else "") + span + ("…" if end < len(text) else "")
+
+    def assess(self, claim: str, doc_ids: Optional[Iterable[int]] = None, top_k: int = TOP_K) -> Dict:
+        """
+        Confidence in [FLOOR, CEILING] (0.4 to 0.95 with the default TOP_K) plus
+        the best-supporting documents and spans. doc_ids restricts scoring to
+        those documents (default: the whole index).
+        """
+        terms = claim_terms(claim)
+        allowed = set(doc_ids) if doc_ids is not None else None
+        scores = self._scores(terms, allowed)
+        # BM25 ranks the documents; coverage, which document length doesn't
+        # discount, calibrates the confidence
+        total_idf = sum(self.idf(t) for t in terms) or 1.0
+        ranked = sorted(scores.items(), key=lambda kv: kv[1][0], reverse=True)[:top_k]
+        coverage = {d: min(1.0, matched_idf / total_idf) for d, (_, matched_idf, _) in ranked}
+        support = sum(coverage.values())
+        confidence = min(CEILING, FLOOR + SPAN * (1 - math.exp(-RATE * support)))
+        evidence = []
+        for d, (_, _, matched) in ranked:
+            evidence.append({
+                "url": self.docs[d].get("url", ""),
+                "title": self.docs[d].get("title", ""),
+                "span": self._span(d, matched),
+                "matched": matched,
+                "score": round(coverage[d], 3),
+            })
+        return {
+            "confidence": confidence,
+            "sources": [self.docs[d] for d, _ in ranked],
+            "evidence": evidence,
+        }
+
+    def assess_all(self, claims: List[str], top_k: int = TOP_K) -> List[Dict]:
+        """
+        One batched pass: every claim against every document in the index.
+        """
+        return [self.assess(c, top_k=top_k) for c in claims]
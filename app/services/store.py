@@ -0,0 +1,31 @@
+# app/services/store.py
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+class LocalDB:
+    """
+    Thread-local SQLite connections to one file (WAL, autocommit), with the
+    schema applied on first connect. Shared by the caches, job store, etc.
+    so several uvicorn workers on one box can use the same file.
+    """
+
+    def __init__(self, path: str, schema: str = ""):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def conn(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if self.schema:
+                conn.executescript(self.schema)
+            self._local.conn = conn
+        return conn
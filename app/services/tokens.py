@@ -0,0 +1,29 @@
+# app/services/tokens.py
+import math
+import re
+from functools import lru_cache
+from typing import Optional
+
+# Exact counts when tiktoken is installed (optional dependency), otherwise an
+# estimate that errs on the high side: ~4 chars per token for prose, but never
+# fewer than one token per word or punctuation mark.
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    enc = _encoding(model or "gpt-4o")
+    if enc is not None:
+        return len(enc.encode(text))
+    return max(math.ceil(len(text) / 4), len(_PIECES.findall(text)))
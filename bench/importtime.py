@@ -0,0 +1,105 @@
+# bench/importtime.py
+"""
+Import-time budget for cold starts: imports a module in fresh interpreters
+with `python -X importtime` and reports where the time goes, per top-level
+package and per module.
+
+    python -m bench.importtime                          # app.main, median of 5 runs
+    python -m bench.importtime --budget-ms 1500         # exit 1 when over budget
+    python -m bench.importtime --module app.services.draft --top 30 --json imports.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# "import time:       self [us] |      cumulative |   imported package"
+Row = Tuple[str, int, int]  # module, self us, cumulative us
+
+def parse_importtime(stderr: str) -> List[Row]:
+    rows: List[Row] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+def measure(module: str, runs: int) -> List[List[Row]]:
+    out = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        out.append(parse_importtime(proc.stderr))
+    return out
+
+def summarize(module: str, all_rows: List[List[Row]], top: int) -> Dict:
+    """
+    Medians across runs: total cost of importing `module`, self time summed
+    per top-level package, and the slowest single modules by self time.
+    """
+    totals, packages, modules = [], defaultdict(list), defaultdict(list)
+    for rows in all_rows:
+        totals.append(next((cum for name, _, cum in rows if name == module), 0))
+        per_pkg: Dict[str, int] = defaultdict(int)
+        for name, self_us, _ in rows:
+            per_pkg[name.split(".")[0]] += self_us
+            modules[name].append(self_us)
+        for pkg, us in per_pkg.items():
+            packages[pkg].append(us)
+
+    def ms(values: List[int]) -> float:
+        return round(statistics.median(values) / 1000, 1)
+
+    return {
+        "module": module,
+        "runs": len(all_rows),
+        "total_ms": ms(totals),
+        "packages": sorted(({"package": p, "ms": ms(v)} for p, v in packages.items()),
+                           key=lambda r: r["ms"], reverse=True)[:top],
+        "modules": sorted(({"module": m, "ms": ms(v)} for m, v in modules.items()),
+                          key=lambda r: r["ms"], reverse=True)[:top],
+    }
+
+def print_report(report: Dict) -> None:
+    print(f"import {report['module']}: {report['total_ms']:.1f} ms (median of {report['runs']} runs)\n")
+    print(f"{'package':<32}{'self ms':>10}")
+    for r in report["packages"]:
+        print(f"{r['package']:<32}{r['ms']:>10.1f}")
+    print(f"\n{'module':<56}{'self ms':>10}")
+    for r in report["modules"]:
+        print(f"{r['module']:<56}{r['ms']:>10.1f}")
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Per-module import cost and cold-start budget check.")
+    ap.add_argument("--module", default="app.main")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="rows per table")
+    ap.add_argument("--budget-ms", type=float, help="exit 1 when the median import time is above this")
+    ap.add_argument("--json", help="write the report to this file")
+    return ap.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # one untimed import first so .pyc writing doesn't count against the budget
+    measure(args.module, 1)
+    report = summarize(args.module, measure(args.module, args.runs), args.top)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.budget_ms is not None:
+        over = report["total_ms"] > args.budget_ms
+        print(f"\n{'OVER' if over else 'within'} budget: {report['total_ms']:.1f} ms vs {args.budget_ms:.0f} ms")
+        return 1 if over else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
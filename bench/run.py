@@ -0,0 +1,287 @@
+# bench/run.py
+"""
+Offline load test: runs the real FastAPI app against the local stubs in
+bench/stubs.py and reports throughput, latency percentiles and upstream calls
+per flow and concurrency level. No keys or network access needed.
+
+    python -m bench.run
+    python -m bench.run --flows generate,factcheck --concurrency 1,8,32 --requests 64
+    python -m bench.run --openai-latency-ms 800 --rate-limit-rate 0.05 --json out.json
+    python -m bench.run --baseline out.json --tolerance 0.2   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List
+
+import httpx
+import uvicorn
+
+FLOWS = ("generate", "stream", "factcheck", "factcheck_job", "publish", "bulk")
+# rendered by the templates; base.html's script has similar strings, so it is cut out first
+ERROR_MARKERS = ("<strong>Error:</strong>", "<div class=\"muted\">Could not verify this claim", "❌ Bluesky error")
+_SCRIPT = re.compile(r"<script>.*?</script>", re.S)
+
+# ---------------------------
+# Servers
+# ---------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 15
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError(f"server on port {port} did not start")
+        time.sleep(0.05)
+    return server
+
+def _point_app_at_stubs(stub_url: str, workdir: str, use_cache: bool) -> None:
+    # must run before app.config is imported: settings are read once from the env
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "SERPAPI_KEY": "bench",
+        "SERPAPI_URL": f"{stub_url}/search.json",
+        "BLUESKY_BASE_URL": stub_url,
+        "BLUESKY_HANDLE": "bench.test",
+        "BLUESKY_APP_PASSWORD": "bench",
+        "BLUESKY_SESSION_DIR": os.path.join(workdir, "bluesky"),
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "OUTBOX_DB_PATH": os.path.join(workdir, "outbox.sqlite3"),
+        "PROFILE_DIR": os.path.join(workdir, "profiles"),
+        "BLUESKY_POSTS_PER_HOUR": "3600000",  # the stub has no createRecord limit
+        "SEARCH_CACHE_TTL": os.environ.get("SEARCH_CACHE_TTL", "86400") if use_cache else "0",
+        "EVIDENCE_INDEX": "1" if use_cache else "0",  # it would cut later levels' SerpApi calls too
+        "EVIDENCE_DB_PATH": os.path.join(workdir, "evidence.sqlite3"),
+        "DRAFT_CACHE_TTL": "0",
+        "HTTP_HTTP2": "0",
+    })
+
+# ---------------------------
+# Flows
+# ---------------------------
+def _ok_html(r: httpx.Response) -> bool:
+    markup = _SCRIPT.sub("", r.text)
+    return r.status_code == 200 and not any(m in markup for m in ERROR_MARKERS)
+
+def _post_text(tag: str) -> str:
+    return f"Benchmark fact number 1 happened in 2011. Benchmark fact number 2 happened in 2012. ({tag})"
+
+async def flow_generate(c: httpx.AsyncClient, tag: str) -> bool:
+    r = await c.post("/topic/generate", data={"topic": f"bench {tag}", "platform": "bluesky", "use_research": "1", "fresh": "1"})
+    return _ok_html(r)
+
+async def flow_stream(c: httpx.AsyncClient, tag: str) -> bool:
+    data = {"topic": f"bench {tag}", "platform": "bluesky", "use_research": "1", "fresh": "1"}
+    async with c.stream("POST", "/topic/generate/stream", data=data) as r:
+        body = "".join([chunk async for chunk in r.aiter_text()])
+    return r.status_code == 200 and "event: done" in body and "event: error" not in body
+
+async def flow_factcheck(c: httpx.AsyncClient, tag: str) -> bool:
+    return _ok_html(await c.post("/topic/factcheck", data={"text": _post_text(tag), "platform": "bluesky"}))
+
+async def flow_factcheck_job(c: httpx.AsyncClient, tag: str) -> bool:
+    r = await c.post("/factcheck/jobs", data={"text": _post_text(tag)})
+    if r.status_code != 202:
+        return False
+    job_id = r.json()["job_id"]
+    while True:
+        job = (await c.get(f"/factcheck/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            return job["status"] == "done" and not any(a and a.get("error") for a in job["audits"])
+        await asyncio.sleep(0.05)
+
+async def flow_publish(c: httpx.AsyncClient, tag: str) -> bool:
+    return _ok_html(await c.post("/topic/publish/bluesky", data={"text": f"Benchmark post {tag}"}))
+
+async def flow_bulk(c: httpx.AsyncClient, tag: str) -> bool:
+    items = [{"topic": {"title": f"bench {tag} #{i}"}, "platform": "bluesky", "use_research": True, "fresh": True}
+             for i in range(5)]
+    r = await c.post("/api/generate/bulk", json={"items": items})
+    lines = [json.loads(l) for l in r.text.splitlines() if l.strip()]
+    return r.status_code == 200 and len(lines) == len(items) and all(l["ok"] for l in lines)
+
+FLOW_FUNCS: Dict[str, Callable] = {name: globals()[f"flow_{name}"] for name in FLOWS}
+
+# ---------------------------
+# Driver
+# ---------------------------
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, int(round(p / 100 * len(s) + 0.5)) - 1))]
+
+async def run_level(c: httpx.AsyncClient, stubs: httpx.AsyncClient, flow: str, concurrency: int, total: int) -> Dict:
+    """
+    Closed loop: `concurrency` workers issue `total` requests between them.
+    """
+    await stubs.post("/_reset")
+    fn, run_id = FLOW_FUNCS[flow], uuid.uuid4().hex[:8]
+    latencies: List[float] = []
+    failures = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal failures
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = await fn(c, f"{run_id}-{i}")
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            failures += 0 if ok else 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    calls = (await stubs.get("/_stats")).json()
+    return {
+        "flow": flow,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok_rate": round(1 - failures / total, 4),
+        "rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "upstream_calls": calls,
+    }
+
+def _upstream_totals(calls: Dict[str, int]) -> Dict[str, int]:
+    # "openai.chat" -> "openai"; the ".429"/".500" keys are outcomes, not extra calls
+    per: Dict[str, int] = {}
+    for key, n in calls.items():
+        upstream, op = key.split(".", 1)
+        if op not in ("429", "500"):
+            per[upstream] = per.get(upstream, 0) + n
+    return per
+
+def _calls_summary(calls: Dict[str, int], requests: int) -> str:
+    s = " ".join(f"{u}={n / requests:.2f}" for u, n in sorted(_upstream_totals(calls).items()))
+    errs = " ".join(f"{k}={n}" for k, n in sorted(calls.items()) if k.endswith((".429", ".500")))
+    return s + (f"  [{errs}]" if errs else "")
+
+def print_table(results: List[Dict]) -> None:
+    print(f"{'flow':<14}{'conc':>5}{'reqs':>6}{'ok%':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  upstream calls/request")
+    for r in results:
+        print(f"{r['flow']:<14}{r['concurrency']:>5}{r['requests']:>6}{r['ok_rate'] * 100:>6.1f}%{r['rps']:>9.2f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}  {_calls_summary(r['upstream_calls'], r['requests'])}")
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """
+    Regressions vs a previous --json run: p95 latency or throughput worse by more
+    than `tolerance`, more upstream calls per request, or a lower success rate.
+    """
+    base = {(b["flow"], b["concurrency"]): b for b in baseline}
+    problems = []
+    for r in results:
+        b = base.get((r["flow"], r["concurrency"]))
+        if not b:
+            continue
+        label = f"{r['flow']}@{r['concurrency']}"
+        if r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            problems.append(f"{label}: p95 {b['p95_ms']}ms -> {r['p95_ms']}ms")
+        if r["rps"] < b["rps"] * (1 - tolerance):
+            problems.append(f"{label}: throughput {b['rps']} -> {r['rps']} req/s")
+        calls_now = sum(_upstream_totals(r["upstream_calls"]).values()) / r["requests"]
+        calls_before = sum(_upstream_totals(b["upstream_calls"]).values()) / b["requests"]
+        if calls_now > calls_before * (1 + tolerance):
+            problems.append(f"{label}: upstream calls/request {calls_before:.2f} -> {calls_now:.2f}")
+        if r["ok_rate"] < b["ok_rate"] - 0.01:
+            problems.append(f"{label}: ok rate {b['ok_rate']} -> {r['ok_rate']}")
+    return problems
+
+def _profile_overrides(args) -> Dict[str, Dict]:
+    out: Dict[str, Dict] = {}
+    for upstream in ("openai", "serpapi", "bluesky"):
+        latency = getattr(args, f"{upstream}_latency_ms")
+        if latency is not None:
+            out.setdefault(upstream, {})["latency_ms"] = latency
+        if args.error_rate is not None:
+            out.setdefault(upstream, {})["error_rate"] = args.error_rate
+        if args.rate_limit_rate is not None:
+            out.setdefault(upstream, {})["rate_limit_rate"] = args.rate_limit_rate
+    return out
+
+async def main_async(args, app_url: str, stub_url: str) -> List[Dict]:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=app_url, timeout=300, limits=limits) as c, \
+               httpx.AsyncClient(base_url=stub_url, timeout=30) as stubs:
+        overrides = _profile_overrides(args)
+        if overrides:
+            await stubs.post("/_config", json=overrides)
+        results = []
+        for flow in args.flows:
+            for conc in args.concurrency:
+                r = await run_level(c, stubs, flow, conc, max(args.requests, conc))
+                results.append(r)
+                if args.verbose:
+                    print_table([r])
+        return results
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Offline load test against stub upstreams.")
+    ap.add_argument("--flows", default="generate,stream,factcheck,publish",
+                    type=lambda s: [f for f in s.split(",") if f], help=f"comma list of {', '.join(FLOWS)}")
+    ap.add_argument("--concurrency", default="1,4,16", type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("--requests", type=int, default=32, help="requests per flow and concurrency level")
+    ap.add_argument("--openai-latency-ms", type=float)
+    ap.add_argument("--serpapi-latency-ms", type=float)
+    ap.add_argument("--bluesky-latency-ms", type=float)
+    ap.add_argument("--error-rate", type=float, help="share of 500s from every upstream")
+    ap.add_argument("--rate-limit-rate", type=float, help="share of 429s from every upstream")
+    ap.add_argument("--use-cache", action="store_true", help="keep the search cache and evidence index on (off by default)")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--baseline", help="compare against a previous --json file")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("-v", "--verbose", action="store_true", help="print each level as it finishes")
+    args = ap.parse_args(argv)
+    unknown = [f for f in args.flows if f not in FLOWS]
+    if unknown:
+        ap.error(f"unknown flow(s): {', '.join(unknown)}")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="autocreator-bench-")
+    from bench.stubs import stub_app
+    stub_port = _free_port()
+    _serve(stub_app, stub_port)
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    _point_app_at_stubs(stub_url, workdir, args.use_cache)
+
+    from app.main import app  # imported only now so settings pick up the stub URLs
+    app_port = _free_port()
+    _serve(app, app_port)
+
+    results = asyncio.run(main_async(args, f"http://127.0.0.1:{app_port}", stub_url))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f)["results"], args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
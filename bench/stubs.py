@@ -0,0 +1,224 @@
+# bench/stubs.py
+import asyncio
+import base64
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-ins for OpenAI chat completions, SerpApi search.json and the
+# Bluesky XRPC calls the app makes. One server, three path prefixes:
+#   /v1/chat/completions   -> OPENAI_BASE_URL=http://host:port/v1
+#   /search.json           -> SERPAPI_URL=http://host:port/search.json
+#   /xrpc/...              -> BLUESKY_BASE_URL=http://host:port
+# Latency, error rate and 429 rate are set per upstream (POST /_config).
+
+@dataclass
+class UpstreamProfile:
+    latency_ms: float = 50.0     # mean response time
+    jitter_ms: float = 10.0      # +/- uniform jitter
+    error_rate: float = 0.0      # share of 500s
+    rate_limit_rate: float = 0.0 # share of 429s (with Retry-After)
+    retry_after: float = 0.1
+    stream_chunks: int = 20      # OpenAI streaming: chunks per response
+
+profiles: Dict[str, UpstreamProfile] = {
+    "openai": UpstreamProfile(latency_ms=400, jitter_ms=100),
+    "serpapi": UpstreamProfile(latency_ms=150, jitter_ms=50),
+    "bluesky": UpstreamProfile(latency_ms=80, jitter_ms=20),
+}
+calls: Counter = Counter()
+
+stub_app = FastAPI(title="AutoCreator upstream stubs")
+
+async def _gate(upstream: str, op: str) -> Optional[JSONResponse]:
+    """
+    Count the call, sleep for the profile latency, then maybe fail.
+    Returns the error response to send, or None to carry on.
+    """
+    p = profiles[upstream]
+    calls[f"{upstream}.{op}"] += 1
+    delay = max(0.0, p.latency_ms + random.uniform(-p.jitter_ms, p.jitter_ms)) / 1000
+    await asyncio.sleep(delay)
+    roll = random.random()
+    if roll < p.rate_limit_rate:
+        calls[f"{upstream}.429"] += 1
+        return JSONResponse({"error": {"message": "rate limited", "type": "rate_limit"}}, status_code=429,
+                            headers={"Retry-After": str(p.retry_after)})
+    if roll < p.rate_limit_rate + p.error_rate:
+        calls[f"{upstream}.500"] += 1
+        return JSONResponse({"error": {"message": "stub failure", "type": "server_error"}}, status_code=500)
+    return None
+
+# ---------------------------
+# OpenAI
+# ---------------------------
+def _completion_json(prompt: str) -> str:
+    if "extract short factual claims" in prompt:
+        m = re.search(r"MAX_CLAIMS: (\d+)", prompt)
+        n = min(int(m.group(1)) if m else 5, 5)
+        return json.dumps({"items": [f"Benchmark fact number {i} happened in 20{10 + i}" for i in range(1, n + 1)]})
+    m = re.search(r"^N: (\d+)$", prompt, re.M)
+    n = int(m.group(1)) if m else 3
+    items = [{
+        "variant": i,
+        "text": f"Variant {i}: a stub post about benchmarks. Fact {i} happened in 20{10 + i}. " * 3,
+        "rationale": "stub",
+    } for i in range(1, n + 1)]
+    if '"claims"' in prompt:
+        for item in items:
+            item["claims"] = [f"Fact {item['variant']} happened in 20{10 + item['variant']}"]
+    return json.dumps({"items": items})
+
+# prompt caching as OpenAI documents it: prefixes of >= 1024 tokens, matched
+# in 128-token steps (here ~4 chars per token)
+_CACHE_BLOCK, _CACHE_MIN = 128 * 4, 1024 * 4
+_seen_prefixes: set = set()
+
+def _cached_chars(prompt: str) -> int:
+    """
+    Length of the longest previously seen prefix (0 below the minimum).
+    """
+    cached, hit = 0, True
+    for end in range(_CACHE_MIN, len(prompt) + 1, _CACHE_BLOCK):
+        key = hash(prompt[:end])
+        hit = hit and key in _seen_prefixes
+        if hit:
+            cached = end
+        _seen_prefixes.add(key)
+    return cached
+
+def _usage(prompt: str, content: str) -> Dict:
+    p, c = len(prompt) // 4, len(content) // 4
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c,
+            "prompt_tokens_details": {"cached_tokens": _cached_chars(prompt) // 4}}
+
+@stub_app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stream = bool(body.get("stream"))
+    err = await _gate("openai", "stream" if stream else "chat")
+    if err:
+        return err
+    prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+    content = _completion_json(prompt)
+    rid, created, model = f"chatcmpl-{uuid.uuid4().hex[:12]}", int(time.time()), body.get("model", "stub")
+    if not stream:
+        return {
+            "id": rid, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": _usage(prompt, content),
+        }
+
+    profile = profiles["openai"]
+
+    async def events():
+        size = max(1, len(content) // max(1, profile.stream_chunks))
+        for i in range(0, len(content), size):
+            chunk = {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": content[i:i + size]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(0.005)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield "data: " + json.dumps({"id": rid, "object": "chat.completion.chunk", "created": created,
+                                         "model": model, "choices": [], "usage": _usage(prompt, content)}) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# ---------------------------
+# SerpApi
+# ---------------------------
+@stub_app.get("/search.json")
+async def search(q: str = "", num: int = 5):
+    err = await _gate("serpapi", "search")
+    if err:
+        return err
+    return {"organic_results": [{
+        "title": f"{q} — result {i}",
+        "link": f"https://example{i}.org/{uuid.uuid4().hex[:8]}",
+        "snippet": f"Benchmark fact number {i} happened in 20{10 + i}. Notes on {q}.",
+    } for i in range(1, num + 1)]}
+
+# ---------------------------
+# Bluesky XRPC
+# ---------------------------
+def _jwt(ttl: int) -> str:
+    def b64(obj) -> str:
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    now = int(time.time())
+    return f"{b64({'alg': 'HS256', 'typ': 'JWT'})}.{b64({'sub': 'did:plc:bench', 'iat': now, 'exp': now + ttl})}.c2ln"
+
+def _session(handle: str) -> Dict:
+    return {"accessJwt": _jwt(7200), "refreshJwt": _jwt(86400), "did": "did:plc:bench", "handle": handle}
+
+@stub_app.post("/xrpc/com.atproto.server.createSession")
+async def create_session(request: Request):
+    err = await _gate("bluesky", "createSession")
+    if err:
+        return err
+    body = await request.json()
+    return _session(body.get("identifier") or "bench.test")
+
+@stub_app.post("/xrpc/com.atproto.server.refreshSession")
+async def refresh_session():
+    err = await _gate("bluesky", "refreshSession")
+    return err or _session("bench.test")
+
+@stub_app.get("/xrpc/app.bsky.actor.getProfile")
+async def get_profile(actor: str = ""):
+    err = await _gate("bluesky", "getProfile")
+    return err or {"did": "did:plc:bench", "handle": actor or "bench.test"}
+
+_records: Dict[str, Dict] = {}  # rkey -> post record
+
+@stub_app.post("/xrpc/com.atproto.repo.createRecord")
+async def create_record(request: Request):
+    err = await _gate("bluesky", "createRecord")
+    if err:
+        return err
+    body = await request.json()
+    rkey = body.get("rkey") or uuid.uuid4().hex[:13]
+    if rkey in _records:
+        return JSONResponse({"error": "InvalidRequest", "message": "Record already exists"}, status_code=400)
+    _records[rkey] = body.get("record") or {}
+    return {"uri": f"at://did:plc:bench/app.bsky.feed.post/{rkey}", "cid": f"bafy{rkey}"}
+
+@stub_app.get("/xrpc/com.atproto.repo.getRecord")
+async def get_record(rkey: str = ""):
+    err = await _gate("bluesky", "getRecord")
+    if err:
+        return err
+    if rkey not in _records:
+        return JSONResponse({"error": "RecordNotFound", "message": f"Could not locate record: {rkey}"}, status_code=400)
+    return {"uri": f"at://did:plc:bench/app.bsky.feed.post/{rkey}", "cid": f"bafy{rkey}", "value": _records[rkey]}
+
+# ---------------------------
+# Control
+# ---------------------------
+@stub_app.get("/_stats")
+async def stats():
+    return dict(calls)
+
+@stub_app.post("/_reset")
+async def reset():
+    calls.clear()
+    _records.clear()
+    return {"ok": True}
+
+@stub_app.post("/_config")
+async def configure(request: Request):
+    """
+    Body: {"openai": {"latency_ms": 200, "rate_limit_rate": 0.1}, ...}
+    """
+    for upstream, values in (await request.json()).items():
+        for k, v in values.items():
+            setattr(profiles[upstream], k, type(getattr(profiles[upstream], k))(v))
+    return {k: asdict(v) for k, v in profiles.items()}
@@ -0,0 +1,42 @@
+import pytest
+from app.services.scoring import CEILING, FLOOR, EvidenceIndex, tokenize
+
+CLAIM = "Perseverance landed on Mars in February 2021"
+
+FULL = [
+    {"url": "https://a.example", "title": "Perseverance rover landed on Mars",
+     "snippet": "NASA's Perseverance landed in Jezero crater in February 2021 after a seven-month cruise."},
+    {"url": "https://b.example", "title": "Mars 2020 mission",
+     "snippet": "Perseverance landed on Mars on 18 February 2021."},
+    {"url": "https://c.example", "title": "Landing day",
+     "snippet": "In February 2021 Perseverance landed safely on Mars."},
+]
+UNRELATED = {"url": "https://z.example", "title": "Baking bread", "snippet": "Knead the dough for ten minutes."}
+
+def confidence(results, claim=CLAIM):
+    return EvidenceIndex(results).assess(claim)["confidence"]
+
+def test_no_support_is_floor():
+    assert confidence([]) == FLOOR
+    assert confidence([UNRELATED]) == FLOOR
+
+def test_one_full_hit_is_medium():
+    assert 0.7 <= confidence([FULL[0], UNRELATED]) < 0.85
+
+def test_two_full_hits_are_strong():
+    assert confidence(FULL[:2] + [UNRELATED]) >= 0.85
+
+def test_three_full_hits_reach_ceiling():
+    assert confidence(FULL) == pytest.approx(CEILING)
+    assert confidence(FULL + [dict(FULL[0], url="https://d.example")]) <= CEILING
+
+def test_partial_hit_scores_below_full_hit():
+    partial = {"url": "https://p.example", "title": "Mars", "snippet": "The red planet."}
+    assert FLOOR < confidence([partial, UNRELATED]) < confidence([FULL[0], UNRELATED])
+
+def test_whole_token_matching():
+    assert [t for t, _, _ in tokenize("database of 1,200 rows")] == ["database", "1200", "rows"]
+    index = EvidenceIndex([{"url": "https://db.example", "title": "A database primer", "snippet": "Tables and rows."}])
+    audit = index.assess("data breach")
+    assert audit["confidence"] == FLOOR
+    assert audit["evidence"] == []
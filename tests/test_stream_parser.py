@@ -0,0 +1,49 @@
+import json
+import random
+
+import pytest
+from app.services.draft import _ItemsStreamParser, _parse_variants, _variant
+
+PAYLOAD = {
+    "items": [
+        {"variant": 1, "text": "Perseverance landed on Mars — \"Jezero\" \U0001F680\nin 2021.",
+         "rationale": "news hook", "claims": ["Perseverance landed in 2021", {"claim": "Jezero crater", "span": [0, 5]}],
+         "extra": {"tone": "upbeat", "tags": ["space", {"nested": [1, 2.5, None, True]}]}},
+        {"variant": 2, "text": "Second take, with {braces} and [brackets] inside the text.",
+         "claims": [], "rationale": None},
+        {"variant": 3, "text": "Third", "claims": [{"text": "object claim"}, "string claim"], "extra": {}},
+    ]
+}
+
+def run(chunks):
+    parser = _ItemsStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+def random_chunks(source, rng):
+    chunks, pos = [], 0
+    while pos < len(source):
+        size = rng.randint(1, 12)
+        chunks.append(source[pos:pos + size])
+        pos += size
+    return chunks
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunks_match_whole_parse(seed, ensure_ascii):
+    source = json.dumps(PAYLOAD, ensure_ascii=ensure_ascii, indent=seed % 3 or None)
+    events = run(random_chunks(source, random.Random(seed)))
+
+    items = {e[1]: e[2] for e in events if e[0] == "item"}
+    assert items == {i: item for i, item in enumerate(json.loads(source)["items"], start=1)}
+    assert [_variant(items[i], i) for i in sorted(items)] == _parse_variants(source, len(items))
+
+    for i, item in items.items():
+        assert "".join(e[2] for e in events if e[0] == "delta" and e[1] == i) == item["text"]
+
+def test_item_event_follows_its_text():
+    source = json.dumps(PAYLOAD)
+    kinds = [(e[0], e[1]) for e in run(source)]
+    assert kinds.index(("item", 1)) < kinds.index(("delta", 2))